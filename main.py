@@ -1,11 +1,46 @@
 from PyQt5.QtWidgets import QApplication
+import argparse
+import os
 import sys
 from scripts.board import ChessBoard
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    board = ChessBoard()
-    board.show()
-    sys.exit(app.exec_())
+    parser = argparse.ArgumentParser(description='Chess game')
+    parser.add_argument('--engine', choices=['white', 'black'],
+                        help='let the built-in engine play this color')
+    parser.add_argument('--movetime', type=float, default=1.0,
+                        help='engine thinking time per move in seconds')
+    parser.add_argument('--render', choices=['widgets', 'painted'], default='widgets',
+                        help="'painted' draws the whole board in a single widget")
+    parser.add_argument('--analyze', action='store_true',
+                        help='show live engine analysis in the title bar')
+    parser.add_argument('--book', help='opening book file for the engine, '
+                                       'see python -m scripts.book build')
+    parser.add_argument('--tablebase', help='endgame tablebase directory, '
+                                            'see python -m scripts.tablebase generate')
+    args, qt_args = parser.parse_known_args()
+
+    # Opt-in instrumentation, see scripts/profiling.py
+    profile_path = os.environ.get('CHESS_PROFILE')
+    trace_path = os.environ.get('CHESS_TRACE')
+    profiler = None
+    if profile_path or trace_path:
+        from scripts.profiling import Profiler
+        profiler = Profiler()
+        profiler.enable()
 
+    app = QApplication(sys.argv[:1] + qt_args)
+    board = ChessBoard(engine_color=args.engine, engine_movetime=args.movetime,
+                       render_mode=args.render, analyze=args.analyze,
+                       book_path=args.book, tablebase_path=args.tablebase)
+    board.show()
+    exit_code = app.exec_()
+    if profiler:
+        profiler.disable()
+        profiler.report()
+        if profile_path:
+            profiler.write_json(profile_path)
+        if trace_path:
+            profiler.write_chrome_trace(trace_path)
+    sys.exit(exit_code)
@@ -0,0 +1,98 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from scripts.engine import Search, MATE_SCORE, MATE_THRESHOLD, MAX_PLY
+from scripts.move import move_to_uci
+
+
+def format_score(score):
+    """Score in pawns from the side to move's view, or mate in moves as #N"""
+    if score > MATE_THRESHOLD:
+        return f"#{(MATE_SCORE - score + 1) // 2}"
+    if score < -MATE_THRESHOLD:
+        return f"#-{(MATE_SCORE + score + 1) // 2}"
+    return f"{score / 100:+.2f}"
+
+
+def format_info(result):
+    """One line summary of a search iteration"""
+    line = ' '.join(move_to_uci(move) for move in result.pv)
+    return (f"depth {result.depth}  {format_score(result.score)}  {line}  "
+            f"{result.nps} nps")
+
+
+class AnalysisWorker(QThread):
+    """Runs one search of a position snapshot off the GUI thread"""
+    info = pyqtSignal(int, object)
+    done = pyqtSignal(int, object)
+
+    def __init__(self, job, search, position, limits, parent=None):
+        super().__init__(parent)
+        self.job = job
+        self.search = search
+        self.position = position
+        self.limits = limits
+
+    def run(self):
+        result = self.search.search(self.position, on_info=self._emit_info, **self.limits)
+        self.done.emit(self.job, result)
+
+    def _emit_info(self, result):
+        self.info.emit(self.job, result)
+
+
+class AnalysisService(QObject):
+    """Background engine search reporting back through Qt signals.
+
+    start() snapshots the position and searches the copy on a worker thread,
+    so the event loop keeps running. progress is emitted after every
+    completed depth and finished once the search ends, both with the
+    Zobrist key of the analysed position and a SearchResult. Starting again
+    or calling stop() cancels the running search, and anything it still had
+    queued is dropped.
+    """
+    progress = pyqtSignal(object, object)
+    finished = pyqtSignal(object, object)
+
+    def __init__(self, parent=None, tablebase=None):
+        super().__init__(parent)
+        self.search = Search(tablebase=tablebase)
+        self.worker = None
+        self._job = 0
+        self._key = None
+
+    def start(self, position, depth=None, movetime=None, nodes=None):
+        """Analyse a position; without limits the search runs until stopped"""
+        self.stop()
+        if depth is None and movetime is None and nodes is None:
+            depth = MAX_PLY
+        self._job += 1
+        self._key = position.zobrist_key
+        limits = {'depth': depth, 'movetime': movetime, 'nodes': nodes}
+        self.worker = AnalysisWorker(self._job, self.search, position.copy(), limits, self)
+        self.worker.info.connect(self._on_info)
+        self.worker.done.connect(self._on_done)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.worker.start()
+
+    def stop(self):
+        """Cancel the running search and wait for its thread to finish"""
+        if self.worker is None:
+            return
+        # Results still queued from this job no longer match _job
+        self._job += 1
+        # A search that has not started yet would clear a single request
+        self.search.stop()
+        while not self.worker.wait(10):
+            self.search.stop()
+        self.worker = None
+
+    def is_running(self):
+        return self.worker is not None and self.worker.isRunning()
+
+    def _on_info(self, job, result):
+        if job == self._job:
+            self.progress.emit(self._key, result)
+
+    def _on_done(self, job, result):
+        if job == self._job:
+            self.worker = None
+            self.finished.emit(self._key, result)
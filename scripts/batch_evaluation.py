@@ -0,0 +1,177 @@
+"""Batch evaluation with NumPy, for labelling and annotation jobs.
+
+evaluate_batch() stacks the positions into N x 12 x 64 piece planes and
+computes every term of scripts/evaluation.py with array operations,
+giving the same numbers as evaluate(). It lives apart from the scalar
+evaluation so that the engine, which imports that one, never loads
+NumPy. Running the module checks the two against each other:
+
+    python -m scripts.batch_evaluation --games 200
+"""
+import random
+import sys
+from scripts.constants import WHITE, BLACK, PAWN
+from scripts.bitboard import KING_ATTACKS
+from scripts.evaluation import (PIECE_TABLES, MOBILITY_BY_CODE, PAWN_SHIELDS, PASSED_PAWN_BONUS,
+                                DOUBLED_PAWN_PENALTY, ISOLATED_PAWN_PENALTY, PAWN_SHIELD_BONUS,
+                                KING_ZONE_PENALTY, evaluate)
+from scripts.position import Position
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('The batch evaluation API needs NumPy: pip install numpy') from None
+
+_SHIFTS = np.arange(64, dtype=np.uint64)
+_ONE = np.uint64(1)
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+# 12 x 64 material and placement table, plane p holding piece code p + 1
+_PLANE_TABLES = np.array(PIECE_TABLES[1:], dtype=np.int64)
+_MOBILITY_BY_CODE = np.array(MOBILITY_BY_CODE, dtype=np.int64)
+_KING_ATTACKS = np.array(KING_ATTACKS + [0], dtype=np.uint64)
+_PAWN_SHIELDS = np.array([masks + [0] for masks in PAWN_SHIELDS], dtype=np.uint64)
+# Passed pawn bonus per row and the row index, shaped to broadcast over (N, row, file)
+_PASSED_BY_ROW = np.array([[PASSED_PAWN_BONUS[7 - row] for row in range(8)],
+                           PASSED_PAWN_BONUS], dtype=np.int64)[:, None, :, None]
+_ROWS = np.arange(8)[None, :, None]
+# Longest random game played by check()
+CHECK_PLIES = 120
+
+
+def _popcount(array):
+    # Set bits of every element of a uint64 array
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(array).astype(np.int64)
+    array = np.ascontiguousarray(array, dtype=np.uint64)
+    return _POPCOUNT8[array.view(np.uint8)].reshape(array.shape + (8,)).sum(axis=-1)
+
+
+def bitboard_planes(bitboards):
+    """Expand an (..., k) uint64 array of bitboards into (..., k, 64) 0/1 planes"""
+    return ((bitboards[..., None] >> _SHIFTS) & _ONE).astype(np.uint8)
+
+
+def position_planes(positions):
+    """N x 12 x 64 uint8 planes, plane p marking the squares of piece code p + 1"""
+    bitboards = np.array([position.bitboards[1:] for position in positions],
+                         dtype=np.uint64).reshape(-1, 12)
+    return bitboard_planes(bitboards)
+
+
+def _neighbour_files(values, fill, reduce):
+    # Combine each file with its neighbours over the last axis (files)
+    padded = np.pad(values, ((0, 0), (1, 1)), constant_values=fill)
+    return reduce(reduce(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+
+
+def _pawn_structure_batch(white, black):
+    # white and black are N x 8 x 8 (row, file) pawn planes
+    score = np.zeros(len(white), dtype=np.int64)
+    for pawns, sign in ((white, 1), (black, -1)):
+        counts = pawns.sum(axis=1, dtype=np.int64)
+        neighbours = _neighbour_files(counts, 0, np.add) - counts
+        doubled = np.maximum(counts - 1, 0).sum(axis=1)
+        isolated = (counts * (neighbours == 0)).sum(axis=1)
+        score -= sign * (DOUBLED_PAWN_PENALTY * doubled + ISOLATED_PAWN_PENALTY * isolated)
+
+    # A white pawn is passed when every black pawn on its and the adjacent
+    # files stands on its row or behind it, and the other way round for black
+    has_black = black.any(axis=1)
+    black_front = np.where(has_black, black.argmax(axis=1), 8)
+    black_front = _neighbour_files(black_front, 8, np.minimum)
+    has_white = white.any(axis=1)
+    white_front = np.where(has_white, 7 - white[:, ::-1].argmax(axis=1), -1)
+    white_front = _neighbour_files(white_front, -1, np.maximum)
+    white_passed = white.astype(bool) & (black_front[:, None, :] >= _ROWS)
+    black_passed = black.astype(bool) & (white_front[:, None, :] <= _ROWS)
+    score += (white_passed * _PASSED_BY_ROW[WHITE]).sum(axis=(1, 2))
+    score -= (black_passed * _PASSED_BY_ROW[BLACK]).sum(axis=(1, 2))
+    return score
+
+
+def evaluate_batch(positions):
+    """Evaluate many positions at once, returning an int64 array of scores.
+
+    Scores are the same as evaluate() gives, in centipawns from each side to
+    move's point of view.
+    """
+    positions = list(positions)
+    count = len(positions)
+    if not count:
+        return np.zeros(0, dtype=np.int64)
+    bitboards = np.array([position.bitboards[1:] for position in positions],
+                         dtype=np.uint64)
+    planes = bitboard_planes(bitboards)
+    attacks = np.array([position.attacks_from for position in positions], dtype=np.uint64)
+    occupied = np.array([position.occupied for position in positions], dtype=np.uint64)
+    attack_maps = np.array([[position._attack_map(WHITE), position._attack_map(BLACK)]
+                            for position in positions], dtype=np.uint64)
+    kings = np.array([position.king_squares for position in positions], dtype=np.int64)
+    turns = np.array([position.turn for position in positions], dtype=np.int64)
+
+    # Material and piece-square tables: contract the planes with the tables
+    score = np.einsum('npk,pk->n', planes, _PLANE_TABLES, dtype=np.int64)
+
+    # Mobility: attacked squares not held by the piece's own side
+    codes = np.einsum('npk,p->nk', planes, np.arange(1, 13, dtype=np.int64), dtype=np.int64)
+    own = np.where(codes > 6, occupied[:, 1:2], occupied[:, 0:1])
+    score += (_MOBILITY_BY_CODE[codes] * _popcount(attacks & ~own)).sum(axis=1)
+
+    # King safety; a missing king (-1) reads the empty masks at index 64
+    kings = np.where(kings < 0, 64, kings)
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        king = kings[:, color]
+        shield = _PAWN_SHIELDS[color][king] & bitboards[:, PAWN - 1 + 6 * color]
+        pressure = _KING_ATTACKS[king] & attack_maps[:, color ^ 1]
+        score += sign * (PAWN_SHIELD_BONUS * _popcount(shield) -
+                         KING_ZONE_PENALTY * _popcount(pressure))
+
+    pawn_planes = planes[:, [PAWN - 1, PAWN + 5]].reshape(count, 2, 8, 8)
+    score += _pawn_structure_batch(pawn_planes[:, 0], pawn_planes[:, 1])
+    return np.where(turns == BLACK, -score, score)
+
+
+def random_positions(games, seed=0, plies=CHECK_PLIES):
+    """Every position of a number of random games, copied as they are reached"""
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(games):
+        position = Position.initial()
+        for _ in range(rng.randrange(plies)):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+            positions.append(position.copy())
+    return positions
+
+
+def check(positions):
+    """Positions where evaluate_batch() and evaluate() disagree, as [(FEN, batch, scalar)]"""
+    mismatches = []
+    for position, score in zip(positions, evaluate_batch(positions)):
+        expected = evaluate(position)
+        if score != expected:
+            mismatches.append((position.to_fen(), int(score), expected))
+    return mismatches
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Check evaluate_batch() against evaluate()')
+    parser.add_argument('--games', type=int, default=200,
+                        help='random games to take positions from')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    positions = random_positions(args.games, args.seed)
+    start = time.perf_counter()
+    mismatches = check(positions)
+    print(f"{len(positions)} positions, {len(mismatches)} mismatches, "
+          f"{time.perf_counter() - start:.1f}s")
+    for fen, batch, scalar in mismatches[:10]:
+        print(f"{fen}: batch {batch}, evaluate {scalar}")
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,293 @@
+"""Microbenchmarks of the rules layer, with JSON results and baseline checks.
+
+Every case times one call over a fixed set of positions of a category
+(opening, middlegame, endgame, check). The position's attack map and
+legal move caches are dropped before every call, so a case measures the
+work and not a cache hit. get_piece_moves and legal_moves time the legal
+move generator the game uses; the pseudo_legal cases time the MoveRules
+backends picked with --backend, which know no castling, en passant or
+promotion and are only there to compare the two. Results are written with machine metadata and
+can be compared against a saved run:
+
+    python -m scripts.benchmark --output baseline.json
+    python -m scripts.benchmark --baseline baseline.json --threshold 0.15
+
+Comparison exits with status 1 when any case got slower than the baseline
+by more than the threshold, and refuses with status 2 a baseline run with
+another move generation backend. Timings from different machines are not
+comparable either; the metadata is there to tell.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+from scripts.constants import COLORS, PIECE_TYPES
+from scripts.game_state import GameState
+from scripts.pgn import PGNGame, replay_game
+from scripts.position import Position, START_FEN
+from scripts.rules import MoveRules, BACKENDS
+
+BENCHMARK_POSITIONS = {
+    'opening': [
+        START_FEN,
+        'r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+        'rnbqkb1r/1p2pppp/p2p1n2/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6',
+    ],
+    'middlegame': [
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8',
+    ],
+    'endgame': [
+        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        '8/5pk1/6p1/8/8/6P1/5PK1/8 w - - 0 1',
+        '8/8/8/4k3/8/8/8/R3K3 w - - 0 1',
+    ],
+    'check': [
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        'r1bqkb1r/pppp1Qpp/2n2n2/4p3/2B1P3/8/PPPP1PPP/RNB1K1NR b KQkq - 0 4',
+        'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3',
+        '7k/5Q2/6K1/8/8/8/8/8 b - - 0 1',
+    ],
+}
+
+# Complete games replayed move by move from SAN
+BENCHMARK_GAMES = [
+    ('opera', 'e4 e5 Nf3 d6 d4 Bg4 dxe5 Bxf3 Qxf3 dxe5 Bc4 Nf6 Qb3 Qe7 Nc3 c6 Bg5 b5 '
+              'Nxb5 cxb5 Bxb5+ Nbd7 O-O-O Rd8 Rxd7 Rxd7 Rd1 Qe6 Bxd7+ Nxd7 Qb8+ Nxb8 Rd8#'),
+    ('immortal', 'e4 e5 f4 exf4 Bc4 Qh4+ Kf1 b5 Bxb5 Nf6 Nf3 Qh6 d3 Nh5 Nh4 Qg5 Nf5 c6 '
+                 'g4 Nf6 Rg1 cxb5 h4 Qg6 h5 Qg5 Qf3 Ng8 Bxf4 Qf6 Nc3 Bc5 Nd5 Qxb2 Bd6 '
+                 'Bxg1 e5 Qxa1+ Ke2 Na6 Nxg7+ Kd8 Qf6+ Nxf6 Be7#'),
+]
+
+DEFAULT_REPEAT = 5
+# Shortest time a single repeat is grown to, in seconds
+DEFAULT_MIN_TIME = 0.05
+DEFAULT_THRESHOLD = 0.10
+
+
+def _cold(position):
+    # Forget what the position derived, as if it had just changed
+    position._attack_maps = [None, None]
+    position._legal_cache = None
+
+
+def _placed(positions, piece_type):
+    return [(position, piece, start) for position in positions
+            for color in COLORS for piece, start in position.pieces(color)
+            if piece.piece_type == piece_type]
+
+
+def _piece_moves_case(placed):
+    def run():
+        for position, piece, start in placed:
+            _cold(position)
+            GameState.get_piece_moves(position, piece.color, start)
+    return run
+
+
+def _legal_moves_case(positions):
+    def run():
+        for position in positions:
+            for color in COLORS:
+                _cold(position)
+                GameState.legal_moves(position, color)
+    return run
+
+
+def _valid_moves_case(placed):
+    def run():
+        for position, piece, start in placed:
+            MoveRules.get_valid_moves(piece, start, position)
+    return run
+
+
+def _all_moves_case(positions):
+    def run():
+        for position in positions:
+            for color in COLORS:
+                MoveRules.get_all_moves(position, color)
+    return run
+
+
+def _state_case(positions, check):
+    def run():
+        for position in positions:
+            _cold(position)
+            check(position, position.current_player)
+    return run
+
+
+def _is_check_case(positions):
+    def run():
+        for position in positions:
+            for color in COLORS:
+                _cold(position)
+                GameState.is_check(position, color)
+    return run
+
+
+def _fen_case(fens):
+    position = Position()
+
+    def run():
+        for fen in fens:
+            position.set_fen(fen)
+    return run
+
+
+def _replay_case(games):
+    games = [PGNGame({}, moves.split(), '*') for _, moves in games]
+
+    def run():
+        for game in games:
+            replay_game(game)
+    return run
+
+
+def benchmark_cases():
+    """[(name, callable)] of every benchmark case"""
+    cases = []
+    for category, fens in BENCHMARK_POSITIONS.items():
+        positions = [Position.from_fen(fen) for fen in fens]
+        for piece_type in PIECE_TYPES[1:]:
+            placed = _placed(positions, piece_type)
+            if placed:
+                cases.append((f"get_piece_moves/{piece_type}/{category}",
+                              _piece_moves_case(placed)))
+                cases.append((f"pseudo_legal/{piece_type}/{category}", _valid_moves_case(placed)))
+        cases.append((f"legal_moves/{category}", _legal_moves_case(positions)))
+        cases.append((f"pseudo_legal/all/{category}", _all_moves_case(positions)))
+        cases.append((f"is_check/{category}", _is_check_case(positions)))
+        cases.append((f"is_checkmate/{category}", _state_case(positions, GameState.is_checkmate)))
+        cases.append((f"is_stalemate/{category}", _state_case(positions, GameState.is_stalemate)))
+        cases.append((f"get_defensive_moves/{category}",
+                      _state_case(positions, GameState.get_defensive_moves)))
+        cases.append((f"fen_setup/{category}", _fen_case(fens)))
+    cases.append(('game_replay', _replay_case(BENCHMARK_GAMES)))
+    return cases
+
+
+def measure(function, repeat=DEFAULT_REPEAT, min_time=DEFAULT_MIN_TIME):
+    """Time a callable, returning (median, fastest) seconds per call and the loop count"""
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    times = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return statistics.median(times), min(times), number
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine_metadata():
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'hostname': platform.node(),
+        'commit': _git_commit(),
+        'backend': MoveRules.backend,
+    }
+
+
+def run_benchmarks(pattern=None, repeat=DEFAULT_REPEAT, min_time=DEFAULT_MIN_TIME,
+                   out=sys.stdout):
+    """Run the cases whose name contains pattern and return the JSON-ready report"""
+    results = {}
+    for name, function in benchmark_cases():
+        if pattern and pattern not in name:
+            continue
+        median, fastest, number = measure(function, repeat, min_time)
+        results[name] = {'median_us': median * 1e6, 'min_us': fastest * 1e6,
+                         'loops': number, 'repeat': repeat}
+        if out:
+            out.write(f"{name:40} {median * 1e6:12.1f} us  (min {fastest * 1e6:.1f})\n")
+    return {'metadata': machine_metadata(), 'results': results}
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare fastest times, returning [(name, baseline us, current us, ratio, status)].
+
+    The fastest repeat is the one least disturbed by the rest of the
+    machine, so it is compared rather than the median. status is
+    'regression' when a case is slower than the baseline by more than
+    threshold, 'improvement' when faster by as much, otherwise 'ok'.
+    """
+    rows = []
+    for name, current in report['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        ratio = current['min_us'] / previous['min_us'] if previous['min_us'] else 1.0
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, previous['min_us'], current['min_us'], ratio, status))
+    return rows
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rules layer microbenchmarks')
+    parser.add_argument('--filter', help='only run cases whose name contains this')
+    parser.add_argument('--backend', choices=BACKENDS, default=MoveRules.backend,
+                        help='MoveRules backend for the pseudo_legal cases')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help='seconds each repeat runs at least')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown counted as a regression')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as source:
+            baseline = json.load(source)
+        if baseline['metadata'].get('backend') != args.backend:
+            print(f"error: baseline was run with the {baseline['metadata'].get('backend')} "
+                  f"backend, not {args.backend}")
+            sys.exit(2)
+
+    MoveRules.set_backend(args.backend)
+    start = time.perf_counter()
+    report = run_benchmarks(args.filter, args.repeat, args.min_time)
+    print(f"{len(report['results'])} cases in {time.perf_counter() - start:.1f}s")
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+    if baseline:
+        if baseline['metadata'].get('hostname') != report['metadata']['hostname']:
+            print(f"warning: baseline is from {baseline['metadata'].get('hostname')}")
+        rows = compare(report, baseline, args.threshold)
+        for name, previous, current, ratio, status in rows:
+            print(f"{name:40} {previous:12.1f} -> {current:12.1f} us  {ratio:6.2f}x  {status}")
+        regressions = [row for row in rows if row[4] == 'regression']
+        if regressions:
+            print(f"FAIL: {len(regressions)} of {len(rows)} cases slower than "
+                  f"the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,261 @@
+from scripts.constants import (BOARD_SIZE, DIRECTIONS, WHITE, BLACK,
+                               PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+
+# Bit n of a bitboard is square n = row * 8 + col, the same numbering as Position
+FULL = (1 << 64) - 1
+SQUARE_COORDS = tuple(divmod(sq, BOARD_SIZE) for sq in range(64))
+
+
+def bit(sq):
+    return 1 << sq
+
+
+def iter_bits(bb):
+    """Yield the square index of every set bit, lowest first"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def _on_board(row, col):
+    return 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE
+
+
+def _step_table(deltas):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, BOARD_SIZE)
+        mask = 0
+        for dr, dc in deltas:
+            if _on_board(row + dr, col + dc):
+                mask |= bit((row + dr) * BOARD_SIZE + col + dc)
+        table.append(mask)
+    return table
+
+
+def _ray_table(dr, dc):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, BOARD_SIZE)
+        mask = 0
+        r, c = row + dr, col + dc
+        while _on_board(r, c):
+            mask |= bit(r * BOARD_SIZE + c)
+            r, c = r + dr, c + dc
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(DIRECTIONS['KNIGHT'])
+KING_ATTACKS = _step_table(DIRECTIONS['STRAIGHT'] + DIRECTIONS['DIAGONAL'])
+# Squares attacked by a pawn of the given color standing on each square
+PAWN_ATTACKS = (_step_table([(-1, -1), (-1, 1)]), _step_table([(1, -1), (1, 1)]))
+
+# Rays towards higher square indices have their nearest blocker in the lowest
+# set bit, rays towards lower indices in the highest one. The slider functions
+# below are unrolled per ray since they are the hottest code in move generation
+RAY_E, RAY_S, RAY_SE, RAY_SW = (_ray_table(0, 1), _ray_table(1, 0),
+                                _ray_table(1, 1), _ray_table(1, -1))
+RAY_W, RAY_N, RAY_NW, RAY_NE = (_ray_table(0, -1), _ray_table(-1, 0),
+                                _ray_table(-1, -1), _ray_table(-1, 1))
+
+ROOK_RAYS = [RAY_E[sq] | RAY_S[sq] | RAY_W[sq] | RAY_N[sq] for sq in range(64)]
+BISHOP_RAYS = [RAY_SE[sq] | RAY_SW[sq] | RAY_NW[sq] | RAY_NE[sq] for sq in range(64)]
+
+
+def _between_table():
+    table = [[0] * 64 for _ in range(64)]
+    for ray in (RAY_E, RAY_S, RAY_SE, RAY_SW, RAY_W, RAY_N, RAY_NW, RAY_NE):
+        for sq in range(64):
+            for target in iter_bits(ray[sq]):
+                # Everything up to and including target, minus target itself
+                table[sq][target] = ray[sq] ^ ray[target] ^ bit(target)
+    return table
+
+
+# Squares strictly between two squares on a shared line, 0 if not aligned
+BETWEEN = _between_table()
+
+
+def rook_attacks(sq, occupied):
+    mask = RAY_E[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_E[(blockers & -blockers).bit_length() - 1]
+    attacks = mask
+    mask = RAY_S[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_S[(blockers & -blockers).bit_length() - 1]
+    attacks |= mask
+    mask = RAY_W[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_W[blockers.bit_length() - 1]
+    attacks |= mask
+    mask = RAY_N[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_N[blockers.bit_length() - 1]
+    attacks |= mask
+    return attacks
+
+
+def bishop_attacks(sq, occupied):
+    mask = RAY_SE[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_SE[(blockers & -blockers).bit_length() - 1]
+    attacks = mask
+    mask = RAY_SW[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_SW[(blockers & -blockers).bit_length() - 1]
+    attacks |= mask
+    mask = RAY_NW[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_NW[blockers.bit_length() - 1]
+    attacks |= mask
+    mask = RAY_NE[sq]
+    blockers = mask & occupied
+    if blockers:
+        mask ^= RAY_NE[blockers.bit_length() - 1]
+    attacks |= mask
+    return attacks
+
+
+def piece_attacks(kind, color, sq, occupied):
+    """Squares attacked by a piece, regardless of what stands on them"""
+    if kind == PAWN:
+        return PAWN_ATTACKS[color][sq]
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if kind == BISHOP:
+        return bishop_attacks(sq, occupied)
+    if kind == ROOK:
+        return rook_attacks(sq, occupied)
+    if kind == QUEEN:
+        return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+    return KING_ATTACKS[sq]
+
+
+def _push_table(color, double):
+    step = -8 if color == WHITE else 8
+    start_row = 6 if color == WHITE else 1
+    table = []
+    for sq in range(64):
+        if double:
+            table.append(bit(sq + 2 * step) if sq // BOARD_SIZE == start_row else 0)
+        else:
+            table.append(bit(sq + step) if 0 <= sq + step < 64 else 0)
+    return table
+
+
+# Single and double pawn pushes per color and square, ignoring blockers
+PAWN_PUSHES = (_push_table(WHITE, False), _push_table(BLACK, False))
+PAWN_DOUBLE_PUSHES = (_push_table(WHITE, True), _push_table(BLACK, True))
+
+
+def pawn_pushes(sq, color, occupied):
+    one = PAWN_PUSHES[color][sq]
+    if one & occupied or not one:
+        return 0
+    return one | PAWN_DOUBLE_PUSHES[color][sq] & ~occupied
+
+
+class BitboardRules:
+    """Bitboard implementation of the MoveRules interface.
+
+    Reads the per-piece bitboards and per-square attack sets that Position
+    keeps up to date, so move generation never touches the 64-square array
+    and a piece's targets cost one lookup.
+    """
+
+    @staticmethod
+    def get_move_targets(piece, sq, board):
+        color = piece.color_index
+        own = board.occupied[color]
+        enemy = board.occupied[color ^ 1]
+        if piece.kind == PAWN:
+            return pawn_pushes(sq, color, own | enemy) | PAWN_ATTACKS[color][sq] & enemy
+        if board.board[sq] == piece.code:
+            return board.attacks_from[sq] & ~own
+        # A piece the board does not hold at sq, so no attack set is kept for it
+        return piece_attacks(piece.kind, color, sq, own | enemy) & ~own
+
+    @staticmethod
+    def get_valid_moves(piece, current_pos, board):
+        row, col = current_pos
+        sq = row * BOARD_SIZE + col
+        color = piece.color_index
+        # get_move_targets inlined, this is called once per piece
+        if piece.kind == PAWN:
+            enemy = board.occupied[color ^ 1]
+            occupied = board.occupied[color] | enemy
+            targets = PAWN_ATTACKS[color][sq] & enemy
+            one = PAWN_PUSHES[color][sq]
+            if one and not one & occupied:
+                targets |= one | PAWN_DOUBLE_PUSHES[color][sq] & ~occupied
+        elif board.board[sq] == piece.code:
+            targets = board.attacks_from[sq] & ~board.occupied[color]
+        else:
+            targets = BitboardRules.get_move_targets(piece, sq, board)
+        moves = []
+        while targets:
+            low = targets & -targets
+            moves.append(SQUARE_COORDS[low.bit_length() - 1])
+            targets ^= low
+        return moves
+
+    @staticmethod
+    def get_all_targets(board, color):
+        """Return (from_sq, targets bitboard) for every piece of a color"""
+        pieces = []
+        own = board.occupied[color]
+        enemy = board.occupied[color ^ 1]
+        occupied = own | enemy
+        not_own = ~own
+        attacks_from = board.attacks_from
+        pawns = board.bitboards[PAWN + 6 * color]
+        pawn_attacks = PAWN_ATTACKS[color]
+        for sq in iter_bits(own):
+            if pawns >> sq & 1:
+                pieces.append((sq, pawn_pushes(sq, color, occupied) | pawn_attacks[sq] & enemy))
+            else:
+                pieces.append((sq, attacks_from[sq] & not_own))
+        return pieces
+
+    @staticmethod
+    def get_all_moves(board, color):
+        """(piece, start, end) of every pseudo-legal move of a color, in one pass"""
+        moves = []
+        append = moves.append
+        color_index = BLACK if color == 'black' else WHITE
+        own = board.occupied[color_index]
+        enemy = board.occupied[color_index ^ 1]
+        occupied = own | enemy
+        not_own = ~own
+        attacks_from = board.attacks_from
+        pawns = board.bitboards[PAWN + 6 * color_index]
+        pawn_attacks = PAWN_ATTACKS[color_index]
+        while own:
+            low = own & -own
+            sq = low.bit_length() - 1
+            own ^= low
+            if pawns & low:
+                targets = pawn_pushes(sq, color_index, occupied) | pawn_attacks[sq] & enemy
+            else:
+                targets = attacks_from[sq] & not_own
+            start = SQUARE_COORDS[sq]
+            piece = board.get_piece_at(*start)
+            while targets:
+                low = targets & -targets
+                append((piece, start, SQUARE_COORDS[low.bit_length() - 1]))
+                targets ^= low
+        return moves
@@ -1,18 +1,76 @@
-from PyQt5.QtWidgets import QMainWindow, QWidget, QGridLayout, QMessageBox
-from PyQt5.QtGui import QPainter, QColor, QPen
-from PyQt5.QtCore import Qt
+from datetime import date
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QGridLayout, QMessageBox, QShortcut,
+                             QInputDialog, QFileDialog)
+from PyQt5.QtGui import QPainter, QColor, QPen, QKeySequence
+from PyQt5.QtCore import Qt, QTimer
 from scripts.piece import *
-from scripts.rules import MoveRules
 from scripts.square import ChessSquare
-from scripts.constants import BOARD_SIZE
+from scripts.board_view import BoardWidget
+from scripts.constants import BOARD_SIZE, PIECE_TYPES
 from scripts.game_state import GameState
+from scripts.position import Position, square_index, START_FEN
+from scripts.analysis import AnalysisService, format_info
+from scripts.book import OpeningBook
+from scripts.tablebase import Tablebase, format_result
+from scripts.gamefile import (GameArchive, GameArchiveWriter, GameRecord, record_from_pgn,
+                              ARCHIVE_EXTENSION)
+from scripts.pgn import read_games, write_game
+from scripts.move import move_from, move_to, move_promotion, encode_move, move_to_uci
+
+RENDER_MODES = ('widgets', 'painted')
+GAME_FILE_FILTERS = f'Game archives (*{ARCHIVE_EXTENSION});;PGN files (*.pgn)'
 
 class ChessBoard(QMainWindow):
-    def __init__(self):
+    def __init__(self, engine_color=None, engine_movetime=1.0, render_mode='widgets',
+                 analyze=False, book_path=None, tablebase_path=None):
         super().__init__()
+        if render_mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {render_mode}")
         self.setWindowTitle('Chess Board')
         self.setFixedSize(480, 480)
         
+        # The position model owns the game; the view only renders it
+        self.position = Position.initial()
+        light_color = QColor(255, 206, 158)
+        dark_color = QColor(209, 139, 71)
+        
+        if render_mode == 'painted':
+            # One widget paints the whole board, its squares are plain objects
+            self.board_widget = BoardWidget(self, light_color, dark_color)
+            self.setCentralWidget(self.board_widget)
+            self.squares = self.board_widget.squares
+        else:
+            self.board_widget = None
+            self.create_square_widgets(light_color, dark_color)
+        self.sync_pieces()
+        
+        # Initialize game state
+        self.selected_piece = None
+        self.selected_square = None
+        self.highlighted_squares = []
+        self.game_over = False
+        
+        # Optional built-in opponent playing one of the colors
+        self.engine_color = engine_color
+        self.engine_movetime = engine_movetime
+        # Engine moves and live analysis are searched off the GUI thread
+        self.analyze = analyze
+        # Endgame tables, used by the engine and to announce known results
+        self.tablebase = Tablebase(tablebase_path) if tablebase_path else None
+        self.analysis = AnalysisService(self, self.tablebase)
+        self.analysis.progress.connect(self.show_analysis)
+        self.analysis.finished.connect(self.analysis_finished)
+        # Opening book the engine plays from before it starts searching
+        self.book = OpeningBook(book_path) if book_path else None
+        
+        # Takeback, saving and loading
+        QShortcut(QKeySequence.Undo, self, self.undo_move)
+        QShortcut(QKeySequence.Save, self, self.save_game)
+        QShortcut(QKeySequence.Open, self, self.load_game)
+        
+        self.schedule_engine_move()
+
+    def create_square_widgets(self, light_color, dark_color):
         # Create main widget without margins
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -28,124 +86,190 @@ class ChessBoard(QMainWindow):
         
         # Create board squares
         self.squares = [[None for _ in range(8)] for _ in range(8)]
-        light_color = QColor(255, 206, 158)
-        dark_color = QColor(209, 139, 71)
-        
         for row in range(8):
             for col in range(8):
                 color = light_color if (row + col) % 2 == 0 else dark_color
                 square = ChessSquare(row, col, color)
                 self.squares[row][col] = square
                 self.layout.addWidget(square, row, col)
-                
-                # Add pieces
-                piece = None
-                if row == 1:  # Black pawns
-                    piece = Pawn('black')
-                elif row == 6:  # White pawns
-                    piece = Pawn('white')
-                elif row in [0, 7]:  # Other pieces
-                    color = 'black' if row == 0 else 'white'
-                    if col in [0, 7]:
-                        piece = Rook(color)
-                    elif col in [1, 6]:
-                        piece = Knight(color)
-                    elif col in [2, 5]:
-                        piece = Bishop(color)
-                    elif col == 3:
-                        piece = Queen(color)
-                    elif col == 4:
-                        piece = King(color)
-                
-                if piece:
-                    piece.setParent(square)
-                    square.piece = piece
-        
-        # Initialize game state
-        self.selected_piece = None
-        self.selected_square = None
-        self.highlighted_squares = []
-        self.current_player = 'white'
-        self.game_over = False
+
+    @property
+    def current_player(self):
+        return self.position.current_player
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # Squares rescale their pieces from the cache once they get their new size
+        PixmapCache.invalidate()
+
+    @property
+    def zobrist_key(self):
+        return self.position.zobrist_key
     
     def get_piece_at(self, row, col):
         """Helper method to get piece at given position"""
-        if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE:
-            return self.squares[row][col].piece
-        return None
-
-    def filter_valid_moves(self, piece, current_pos, moves):
-        filtered_moves = []
-        row, col = current_pos
-
-        # For pieces that move in lines (Queen, Rook, Bishop)
-        if piece.piece_type in ['queen', 'rook', 'bishop']:
-            directions = []
-            if piece.piece_type in ['queen', 'rook']:
-                directions.extend(DIRECTIONS['STRAIGHT'])
-            if piece.piece_type in ['queen', 'bishop']:
-                directions.extend(DIRECTIONS['DIAGONAL'])
-
-            for dr, dc in directions:
-                r, c = row + dr, col + dc
-                while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
-                    target_piece = self.get_piece_at(r, c)
-                    if target_piece is None:
-                        filtered_moves.append((r, c))
-                    else:
-                        if target_piece.color != piece.color:
-                            filtered_moves.append((r, c))
-                        break
-                    r, c = r + dr, c + dc
-
-        # For Knight
-        elif piece.piece_type == 'knight':
-            for r, c in moves:
-                target_piece = self.get_piece_at(r, c)
-                if target_piece is None or target_piece.color != piece.color:
-                    filtered_moves.append((r, c))
-
-        # For Pawn
-        elif piece.piece_type == 'pawn':
-            direction = -1 if piece.color == 'white' else 1
-            
-            # Forward moves
-            r = row + direction
-            if self.get_piece_at(r, col) is None:
-                filtered_moves.append((r, col))
-                # Initial two-square move
-                if not piece.has_moved:
-                    r = row + (2 * direction)
-                    if self.get_piece_at(r, col) is None:
-                        filtered_moves.append((r, col))
-            
-            # Diagonal captures
-            for dc in [-1, 1]:
-                r, c = row + direction, col + dc
-                if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
-                    target_piece = self.get_piece_at(r, c)
-                    if target_piece and target_piece.color != piece.color:
-                        filtered_moves.append((r, c))
-
-        return filtered_moves
-
-    def make_move(self, target_square):
-        # Remove captured piece if any
-        if target_square.piece:
-            target_square.piece.deleteLater()
-            target_square.piece = None
-
-        # Move piece to new square
+        return self.position.get_piece_at(row, col)
+
+    def sync_pieces(self):
+        """Update piece labels so they match the position model"""
+        if self.board_widget:
+            self.board_widget.sync_pieces()
+            return
+        
+        spare = {}
+        missing = []
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                square = self.squares[row][col]
+                model_piece = self.position.get_piece_at(row, col)
+                label = square.piece
+                if label and model_piece and (label.piece_type, label.color) == (model_piece.piece_type, model_piece.color):
+                    continue
+                if label:
+                    spare.setdefault((label.piece_type, label.color), []).append(label)
+                    square.piece = None
+                if model_piece:
+                    missing.append((square, model_piece))
+
+        # Reuse labels that moved before creating new ones
+        for square, model_piece in missing:
+            labels = spare.get((model_piece.piece_type, model_piece.color))
+            if labels:
+                label = labels.pop()
+            else:
+                label = PIECE_CLASSES[model_piece.piece_type](model_piece.color)
+            label.setParent(square)
+            square.piece = label
+
+        for labels in spare.values():
+            for label in labels:
+                label.deleteLater()
+
+    def make_move(self, target_square, promotion=None):
         old_square = self.selected_square
-        old_square.piece = None
-        target_square.piece = self.selected_piece
-        self.selected_piece.setParent(target_square)
+        if (promotion is None and self.selected_piece.piece_type == 'pawn'
+                and target_square.row in (0, BOARD_SIZE - 1)):
+            promotion = self.ask_promotion()
+        self.position.make_move(encode_move(square_index(old_square.row, old_square.col),
+                                            square_index(target_square.row, target_square.col),
+                                            promotion or 0))
+        self.sync_pieces()
+        self.update_game_status()
         
-        # Mark piece as moved
-        self.selected_piece.has_moved = True
+        # Clear selection
+        self.selected_piece = None
+        self.selected_square = None
         
-        # Switch turns
-        self.current_player = 'black' if self.current_player == 'white' else 'white'
+        self.schedule_engine_move()
+
+    def ask_promotion(self):
+        """Ask which piece a pawn promotes to, a queen if the dialog is dismissed"""
+        choices = ['Queen', 'Rook', 'Bishop', 'Knight']
+        choice, ok = QInputDialog.getItem(self, 'Promotion', 'Promote pawn to:',
+                                          choices, 0, False)
+        return PIECE_TYPES.index((choice if ok else 'Queen').lower())
+
+    def undo_move(self):
+        """Take back the last move, or the last full turn against the engine"""
+        plies = 2 if self.engine_color and self.current_player != self.engine_color else 1
+        if self.position.ply < plies:
+            return
+        for _ in range(plies):
+            self.position.unmake_move()
+        self.game_over = False
+        self.sync_pieces()
+        self.update_game_status()
+        self.selected_piece = None
+        self.selected_square = None
+        self.schedule_engine_move()
+
+    def move_history(self):
+        """Moves played so far in UCI notation"""
+        return [move_to_uci(move) for move in self.position.move_history()]
+
+    def set_position(self, fen, moves=()):
+        """Load a FEN position, and any moves played from it, into the model and widgets"""
+        self.position.set_fen(fen)
+        for move in moves:
+            self.position.make_move(move)
+        self.game_over = False
+        self.sync_pieces()
+        self.update_game_status()
+        self.selected_piece = None
+        self.selected_square = None
+        self.schedule_engine_move()
+
+    def fen(self):
+        return self.position.to_fen()
+
+    def game_record(self):
+        """The game so far, from the position it was started or loaded from"""
+        start = self.position.copy()
+        while start.ply:
+            start.unmake_move()
+        fen = start.to_fen()
+        players = {color: 'Engine' if color == self.engine_color else 'Player'
+                   for color in ('white', 'black')}
+        headers = {'Event': 'Casual game', 'Date': date.today().strftime('%Y.%m.%d'),
+                   'White': players['white'], 'Black': players['black']}
+        return GameRecord(headers, self.position.move_history(),
+                          GameState.result(self.position), None if fen == START_FEN else fen)
+
+    def save_game(self):
+        """Save the game as a game archive, or as PGN when the file name ends in .pgn"""
+        path, _ = QFileDialog.getSaveFileName(self, 'Save game', '', GAME_FILE_FILTERS)
+        if not path:
+            return
+        record = self.game_record()
+        try:
+            if path.lower().endswith('.pgn'):
+                with open(path, 'w', encoding='utf-8') as out:
+                    write_game(out, record.to_pgn())
+            else:
+                with GameArchiveWriter(path) as writer:
+                    writer.add(record.moves, record.headers, record.result, record.fen)
+        except OSError as error:
+            QMessageBox.warning(self, 'Save failed', str(error))
+
+    def load_game(self):
+        """Load a game from an archive or PGN file, asking which one if it holds several"""
+        path, _ = QFileDialog.getOpenFileName(self, 'Load game', '', GAME_FILE_FILTERS)
+        if not path:
+            return
+        try:
+            if path.lower().endswith('.pgn'):
+                with open(path, encoding='utf-8', errors='replace') as source:
+                    games = list(read_games(source))
+                number = self.ask_game_number(len(games))
+                record = record_from_pgn(games[number]) if number is not None else None
+            else:
+                with GameArchive(path) as archive:
+                    number = self.ask_game_number(len(archive))
+                    record = archive.game(number) if number is not None else None
+            if record is None:
+                return
+            # Archived moves are checked too, the file may not be ours
+            position = record.start_position()
+            for move in record.moves:
+                if move not in position.legal_moves():
+                    raise ValueError('The game contains an illegal move')
+                position.make_move(move)
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, 'Load failed', str(error))
+            return
+        self.set_position(record.fen or START_FEN, record.moves)
+
+    def ask_game_number(self, count):
+        """Index of the game to load from a file of count games, or None"""
+        if not count:
+            raise ValueError('The file holds no games')
+        if count == 1:
+            return 0
+        number, ok = QInputDialog.getInt(self, 'Load game', f'Game (1-{count}):', 1, 1, count)
+        return number - 1 if ok else None
+
+    def update_game_status(self):
+        # Turn was passed by the position model
         opponent_color = 'black' if self.current_player == 'white' else 'white'
         
         # Reset all highlights
@@ -153,109 +277,120 @@ class ChessBoard(QMainWindow):
         self.reset_all_squares()
         
         # Check for check/checkmate
-        if GameState.is_check(self, self.current_player):
+        if GameState.is_check(self.position, self.current_player):
             # Highlight king in check
-            king_pos = GameState.find_king(self, self.current_player)
+            king_pos = GameState.find_king(self.position, self.current_player)
             if king_pos:
                 king_square = self.squares[king_pos[0]][king_pos[1]]
                 king_square.is_checkmate = True
                 king_square.update()
             
-            if GameState.is_checkmate(self, self.current_player):
+            if GameState.is_checkmate(self.position, self.current_player):
                 QMessageBox.information(self, 'Checkmate!', 
                                       f'{opponent_color.capitalize()} wins!')
                 self.game_over = True
+                return
+            # Only highlight defensive moves using get_defensive_moves
+            defensive_moves = GameState.get_defensive_moves(self.position, self.current_player)
+            for _, _, move in defensive_moves:  # Unpack piece, start, end positions
+                target = self.squares[move[0]][move[1]]
+                target.highlight_move()
+                self.highlighted_squares.append(target)
+
+        # Stalemate, repetition, fifty moves and dead material end the game too
+        draw_reason = GameState.draw_reason(self.position)
+        if draw_reason:
+            QMessageBox.information(self, 'Draw', f'Draw by {draw_reason}.')
+            self.game_over = True
+
+    def schedule_engine_move(self):
+        """Start the engine on its turn, or live analysis if enabled, for the new position"""
+        self.analysis.stop()
+        self.setWindowTitle(self.status_title())
+        if self.game_over:
+            return
+        if self.engine_color == self.current_player:
+            move = self.book.choose(self.position) if self.book else None
+            if move:
+                # Let the board repaint the player's move before the reply
+                key = self.position.zobrist_key
+                QTimer.singleShot(100, lambda: self.play_book_move(key, move))
             else:
-                # Only highlight defensive moves using get_defensive_moves
-                defensive_moves = GameState.get_defensive_moves(self, self.current_player)
-                for _, _, move in defensive_moves:  # Unpack piece, start, end positions
-                    target = self.squares[move[0]][move[1]]
-                    target.highlight_move()
-                    self.highlighted_squares.append(target)
-        
-        # Clear selection
-        self.selected_piece = None
-        self.selected_square = None
+                self.analysis.start(self.position, movetime=self.engine_movetime)
+        elif self.analyze:
+            self.analysis.start(self.position)
+
+    def status_title(self):
+        title = 'Chess Board'
+        result = self.tablebase.probe(self.position) if self.tablebase else None
+        if result is not None and not self.game_over:
+            title += f" - {format_result(result, self.current_player)}"
+        return title
+
+    def show_analysis(self, key, result):
+        if key == self.position.zobrist_key:
+            self.setWindowTitle(f"{self.status_title()} - {format_info(result)}")
+
+    def analysis_finished(self, key, result):
+        # The position may have changed since the search was started
+        if (key == self.position.zobrist_key and self.engine_color == self.current_player
+                and not self.game_over and result.best_move):
+            self.play_engine_move(result.best_move)
+
+    def play_book_move(self, key, move):
+        if key == self.position.zobrist_key and self.engine_color == self.current_player:
+            self.play_engine_move(move)
+
+    def play_engine_move(self, move):
+        from_row, from_col = divmod(move_from(move), BOARD_SIZE)
+        to_row, to_col = divmod(move_to(move), BOARD_SIZE)
+        self.clear_highlights()
+        self.selected_piece = self.position.get_piece_at(from_row, from_col)
+        self.selected_square = self.squares[from_row][from_col]
+        self.make_move(self.squares[to_row][to_col], move_promotion(move))
+
+    def closeEvent(self, event):
+        self.analysis.stop()
+        if self.book:
+            self.book.close()
+        if self.tablebase:
+            self.tablebase.close()
+        super().closeEvent(event)
 
     def reset_all_squares(self):
         for row in range(BOARD_SIZE):
             for col in range(BOARD_SIZE):
-                self.squares[row][col].is_checkmate = False
-                self.squares[row][col].update()
+                square = self.squares[row][col]
+                # Only repaint squares that actually carried the check overlay
+                if square.is_checkmate:
+                    square.is_checkmate = False
+                    square.update()
 
     def square_clicked(self, square):
-        if self.game_over:
+        if self.game_over or self.current_player == self.engine_color:
             return
 
-        # If a piece is already selected
+        clicked_piece = self.position.get_piece_at(square.row, square.col)
+
+        # A legal target of the selected piece plays the move
         if self.selected_piece:
-            # If we're in check, only allow defensive moves
-            if GameState.is_check(self, self.current_player):
-                defensive_moves = GameState.get_defensive_moves(self, self.current_player)
-                valid_defensive_moves = []
-                
-                # Find moves for the selected piece
-                for piece, start, end in defensive_moves:
-                    if piece == self.selected_piece:
-                        valid_defensive_moves.append(end)
-                
-                if (square.row, square.col) in valid_defensive_moves:
-                    self.make_move(square)
-                elif square.piece and square.piece.color == self.current_player:
-                    # Select new piece and show its defensive moves
-                    self.clear_highlights()
-                    self.selected_piece = square.piece
-                    self.selected_square = square
-                    square.select_square()
-                    self.highlighted_squares.append(square)
-                    
-                    # Show only this piece's defensive moves
-                    for piece, start, end in defensive_moves:
-                        if piece == self.selected_piece:
-                            target = self.squares[end[0]][end[1]]
-                            target.highlight_move()
-                            self.highlighted_squares.append(target)
-            else:
-                # Normal move handling when not in check
-                valid_moves = MoveRules.get_valid_moves(self.selected_piece, 
-                                                      (self.selected_square.row, self.selected_square.col), 
-                                                      self)
-                
-                if (square.row, square.col) in valid_moves:
-                    # Check if move would put/leave player in check
-                    if not GameState.would_be_in_check(self, self.selected_piece,
-                                                     (self.selected_square.row, self.selected_square.col),
-                                                     (square.row, square.col)):
-                        self.make_move(square)
-                elif square.piece and square.piece.color == self.current_player:
-                    # Select new piece
-                    self.clear_highlights()
-                    self.selected_piece = square.piece
-                    self.selected_square = square
-                    square.select_square()
-                    self.highlighted_squares.append(square)
-                    
-                    # Show valid moves for new selection
-                    valid_moves = MoveRules.get_valid_moves(square.piece, 
-                                                          (square.row, square.col), 
-                                                          self)
-                    for row, col in valid_moves:
-                        target_square = self.squares[row][col]
-                        target_square.highlight_move()
-                        self.highlighted_squares.append(target_square)
-                
-        elif square.piece and square.piece.color == self.current_player:
-            # First piece selection
-            self.selected_piece = square.piece
+            start = (self.selected_square.row, self.selected_square.col)
+            if (square.row, square.col) in GameState.get_piece_moves(self.position,
+                                                                     self.current_player, start):
+                self.make_move(square)
+                return
+
+        if clicked_piece and clicked_piece.color == self.current_player:
+            # Select the piece and show its legal moves; in check these are
+            # exactly the moves that get out of it
+            self.clear_highlights()
+            self.selected_piece = clicked_piece
             self.selected_square = square
             square.select_square()
             self.highlighted_squares.append(square)
-            
-            # Show valid moves
-            valid_moves = MoveRules.get_valid_moves(square.piece, 
-                                                  (square.row, square.col), 
-                                                  self)
-            for row, col in valid_moves:
+
+            for row, col in GameState.get_piece_moves(self.position, self.current_player,
+                                                      (square.row, square.col)):
                 target_square = self.squares[row][col]
                 target_square.highlight_move()
                 self.highlighted_squares.append(target_square)
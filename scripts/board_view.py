@@ -0,0 +1,110 @@
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QPainter
+from PyQt5.QtCore import QRect
+from scripts.constants import BOARD_SIZE
+from scripts.event_handler import ChessEventHandler
+from scripts.piece import PixmapCache
+from scripts.square import draw_square
+
+
+class BoardSquare:
+    """Square state for BoardWidget, with the same interface as ChessSquare.
+
+    Instead of repainting a widget of its own, update() marks only this
+    square's rectangle of the board widget as dirty.
+    """
+    __slots__ = ('view', 'row', 'col', 'base_color', 'current_color', 'piece',
+                 'is_highlighted', 'is_selected', 'is_checkmate')
+
+    def __init__(self, view, row, col, color):
+        self.view = view
+        self.row = row
+        self.col = col
+        self.base_color = color
+        self.current_color = color
+        self.piece = None  # Pieces are painted from the position, not held as labels
+        self.is_highlighted = False
+        self.is_selected = False
+        self.is_checkmate = False
+
+    def update(self):
+        self.view.update(self.view.square_rect(self.row, self.col))
+
+    def highlight_move(self):
+        self.is_highlighted = True
+        self.update()
+
+    def select_square(self):
+        self.is_selected = True
+        self.update()
+
+    def reset_color(self):
+        self.is_highlighted = False
+        self.is_selected = False
+        self.update()
+
+
+class BoardWidget(QWidget):
+    """Single custom-painted widget drawing squares, pieces and highlights"""
+
+    def __init__(self, board, light_color, dark_color):
+        super().__init__()
+        self.board = board
+        self.squares = [[BoardSquare(self, row, col,
+                                     light_color if (row + col) % 2 == 0 else dark_color)
+                         for col in range(BOARD_SIZE)] for row in range(BOARD_SIZE)]
+        # Piece codes as last painted, to find the squares a move changed
+        self.painted_board = None
+        self.setContentsMargins(0, 0, 0, 0)
+
+    def square_size(self):
+        return min(self.width(), self.height()) // BOARD_SIZE
+
+    def square_rect(self, row, col):
+        size = self.square_size()
+        return QRect(col * size, row * size, size, size)
+
+    def square_at(self, pos):
+        size = self.square_size()
+        if size <= 0:
+            return None
+        row, col = pos.y() // size, pos.x() // size
+        if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE:
+            return self.squares[row][col]
+        return None
+
+    def sync_pieces(self):
+        """Repaint only the squares whose piece changed since the last sync"""
+        board = self.board.position.board
+        if self.painted_board is None:
+            self.update()
+        else:
+            for sq, code in enumerate(board):
+                if code != self.painted_board[sq]:
+                    self.update(self.square_rect(*divmod(sq, BOARD_SIZE)))
+        self.painted_board = board[:]
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        PixmapCache.invalidate()
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        size = self.square_size()
+        dirty = event.rect()
+        position = self.board.position
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                rect = QRect(col * size, row * size, size, size)
+                if not dirty.intersects(rect):
+                    continue
+                draw_square(painter, rect, self.squares[row][col])
+                piece = position.get_piece_at(row, col)
+                if piece:
+                    pixmap = PixmapCache.get(piece.color, piece.piece_type, size)
+                    painter.drawPixmap(rect.x() + (size - pixmap.width()) // 2,
+                                       rect.y() + (size - pixmap.height()) // 2, pixmap)
+
+    def mousePressEvent(self, event):
+        ChessEventHandler.handle_board_click(self, event)
@@ -0,0 +1,177 @@
+"""Opening book stored as a sorted binary file of Polyglot-style entries.
+
+Every entry is 16 bytes, big-endian: position key (u64), move (u16),
+weight (u16) and a learn field (u32, unused). Entries are sorted by key so
+a lookup is a binary search over a read-only memory map, and every process
+opening the same book shares one copy in the page cache.
+
+The layout is Polyglot's, but keys are this project's Zobrist keys and
+moves use the packed encoding of scripts/move.py, so books are built with
+build_book below rather than taken from Polyglot files.
+"""
+import mmap
+import os
+import random
+import struct
+import sys
+from collections import defaultdict
+from scripts.pgn import read_games, parse_san
+
+ENTRY = struct.Struct('>QHHI')
+ENTRY_SIZE = ENTRY.size
+KEY = struct.Struct('>Q')
+
+# Plies from the start of a game recorded by the builder
+DEFAULT_BOOK_PLIES = 16
+# Weight per game for a move by the side that went on to win, draw or lose
+RESULT_WEIGHTS = {'win': 2, 'draw': 1, 'loss': 0}
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """Read-only view of a book file; use as a context manager or close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % ENTRY_SIZE:
+            self._file.close()
+            raise ValueError(f"Not a book file: {path}")
+        self.size = size // ENTRY_SIZE
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _first(self, key):
+        # Index of the first entry whose key is not below key
+        low, high = 0, self.size
+        unpack = KEY.unpack_from
+        data = self._map
+        while low < high:
+            middle = (low + high) >> 1
+            if unpack(data, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key):
+        """Return [(move, weight)] stored for a Zobrist key"""
+        found = []
+        data = self._map
+        index = self._first(key)
+        while index < self.size:
+            entry_key, move, weight, _ = ENTRY.unpack_from(data, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+            index += 1
+        return found
+
+    def moves(self, position):
+        """Book moves that are legal in a position, with their weights"""
+        legal = position.legal_moves()
+        return [(move, weight) for move, weight in self.entries(position.zobrist_key)
+                if move in legal]
+
+    def choose(self, position, rng=random, best=False):
+        """Pick a book move, at random in proportion to weight, or None when out of book"""
+        candidates = [(move, weight) for move, weight in self.moves(position) if weight]
+        if not candidates:
+            return None
+        if best:
+            return max(candidates, key=lambda candidate: candidate[1])[0]
+        pick = rng.randrange(sum(weight for _, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick < 0:
+                return move
+        return candidates[-1][0]
+
+
+def book_weights(games, plies=DEFAULT_BOOK_PLIES):
+    """Sum result weights per (key, move) over the opening plies of games"""
+    weights = defaultdict(int)
+    for game in games:
+        # Unfinished games count like draws
+        winner = {'1-0': 0, '0-1': 1}.get(game.result)
+        try:
+            position = game.start_position()
+        except ValueError:
+            continue
+        for san in game.moves[:plies]:
+            try:
+                move = parse_san(position, san)
+            except ValueError:
+                break
+            if winner is None:
+                outcome = 'draw'
+            else:
+                outcome = 'win' if winner == position.turn else 'loss'
+            weights[position.zobrist_key, move] += RESULT_WEIGHTS[outcome]
+            position.make_move(move)
+    return weights
+
+
+def write_book(weights, path, min_weight=1):
+    """Write (key, move) weights as a sorted book file, returning the entry count"""
+    entries = [(key, move, weight) for (key, move), weight in weights.items()
+               if weight >= min_weight]
+    # Keys ascending, then the most played move first
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    top = max((entry[2] for entry in entries), default=0)
+    scale = MAX_WEIGHT / top if top > MAX_WEIGHT else 1
+    with open(path, 'wb') as out:
+        for key, move, weight in entries:
+            out.write(ENTRY.pack(key, move, max(1, int(weight * scale)), 0))
+    return len(entries)
+
+
+def build_book(pgn_stream, path, plies=DEFAULT_BOOK_PLIES, min_weight=1):
+    """Build a book file from a PGN stream, returning the entry count"""
+    return write_book(book_weights(read_games(pgn_stream), plies), path, min_weight)
+
+
+if __name__ == '__main__':
+    import argparse
+    from scripts.move import move_to_uci
+    from scripts.position import Position, START_FEN
+
+    parser = argparse.ArgumentParser(description='Build or query an opening book')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from PGN games')
+    build.add_argument('pgn', help="PGN file, or '-' for stdin")
+    build.add_argument('book', help='book file to write')
+    build.add_argument('--plies', type=int, default=DEFAULT_BOOK_PLIES,
+                       help='opening plies taken from each game')
+    build.add_argument('--min-weight', type=int, default=1,
+                       help='drop moves with less total weight')
+    probe = commands.add_parser('probe', help='list the book moves of a position')
+    probe.add_argument('book')
+    probe.add_argument('--fen', default=START_FEN)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        stream = sys.stdin if args.pgn == '-' else open(args.pgn, encoding='utf-8',
+                                                        errors='replace')
+        with stream:
+            count = build_book(stream, args.book, args.plies, args.min_weight)
+        print(f"{count} entries written to {args.book}")
+    else:
+        with OpeningBook(args.book) as book:
+            for move, weight in book.moves(Position.from_fen(args.fen)):
+                print(f"{move_to_uci(move)} {weight}")
@@ -7,4 +7,18 @@ DIRECTIONS = {
     'STRAIGHT': [(0, 1), (0, -1), (1, 0), (-1, 0)],
     'KNIGHT': [(2, 1), (2, -1), (-2, 1), (-2, -1),
                (1, 2), (1, -2), (-1, 2), (-1, -2)]
-}
\ No newline at end of file
+}
+
+# Colors and piece types used by the position model
+WHITE, BLACK = 0, 1
+COLORS = ('white', 'black')
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+PIECE_TYPES = (None, 'pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+
+# Piece codes are kind + 6 * color, so 1-6 are white, 7-12 black and 0 is empty
+EMPTY = 0
+
+# Castling rights bitmask, in FEN order
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLING_LETTERS = 'KQkq'
@@ -0,0 +1,392 @@
+import sys
+import time
+from scripts.constants import QUEEN
+from scripts.evaluation import evaluate, PIECE_VALUES
+from scripts.movegen import LegalMoveGenerator
+from scripts.move import move_to_uci, parse_uci
+from scripts.position import Position
+
+MATE_SCORE = 100000
+# Scores beyond this are mates, with the distance in plies encoded below MATE_SCORE
+MATE_THRESHOLD = MATE_SCORE - 1000
+INFINITY = 1000000
+MAX_PLY = 64
+DEFAULT_DEPTH = 4
+
+# Transposition table bound types
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# How often (in nodes) the clock and the stop flag are looked at
+CHECK_INTERVAL = 1023
+
+# Move ordering tiers, highest first
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORES = (1 << 23, (1 << 23) - 1)
+
+
+class SearchStopped(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by Zobrist key.
+
+    The slot count never grows. A slot is overwritten when it is empty, holds
+    the same position, was written by an older search, or holds a result
+    searched no deeper than the new one.
+    """
+
+    def __init__(self, entries=1 << 17):
+        if entries & (entries - 1):
+            raise ValueError("Transposition table size must be a power of two")
+        self.mask = entries - 1
+        self.slots = [None] * entries
+        self.generation = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 255
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+
+    def probe(self, key):
+        """Return (key, depth, flag, score, move, generation) or None"""
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        index = key & self.mask
+        entry = self.slots[index]
+        if (entry is None or entry[0] == key or entry[5] != self.generation
+                or depth >= entry[1]):
+            self.slots[index] = (key, depth, flag, score, move, self.generation)
+
+
+class SearchResult:
+    __slots__ = ('best_move', 'score', 'depth', 'nodes', 'elapsed', 'pv')
+
+    def __init__(self, best_move, score, depth, nodes, elapsed, pv):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.pv = pv
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def __repr__(self):
+        return (f"SearchResult({move_to_uci(self.best_move) if self.best_move else None}, "
+                f"score={self.score}, depth={self.depth}, nodes={self.nodes})")
+
+
+def _score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+class Search:
+    """Negamax alpha-beta search with iterative deepening.
+
+    Moves are ordered by transposition table move, MVV-LVA for captures and
+    promotions, killer moves and the history heuristic. Leaves are resolved
+    with a quiescence search over captures and queen promotions. The search
+    works on a copy of the position it is given, so it can be cancelled at
+    any point. With a Tablebase, positions it covers are scored exactly
+    instead of being searched.
+    """
+
+    def __init__(self, tt=None, tablebase=None):
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.tablebase = tablebase
+        self.stop_requested = False
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self._deadline = None
+        self._node_limit = None
+
+    def stop(self):
+        """Ask a running search to return its last completed iteration"""
+        self.stop_requested = True
+
+    def search(self, position, depth=None, movetime=None, nodes=None, on_info=None):
+        """Search a position within a depth, time (seconds) or node budget"""
+        if depth is None:
+            depth = MAX_PLY if movetime or nodes else DEFAULT_DEPTH
+        position = position.copy()
+        self.tt.new_search()
+        self.stop_requested = False
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        start = time.perf_counter()
+        self._deadline = start + movetime if movetime else None
+        self._node_limit = nodes
+
+        root_moves = self._root_moves(position)
+        if not root_moves:
+            score = -MATE_SCORE if position.in_check() else 0
+            return SearchResult(0, score, 0, 0, 0.0, [])
+
+        result = SearchResult(root_moves[0], 0, 0, 0, 0.0, [root_moves[0]])
+        for current_depth in range(1, depth + 1):
+            try:
+                score, best_move = self._search_root(position, root_moves, current_depth)
+            except SearchStopped:
+                break
+            elapsed = time.perf_counter() - start
+            result = SearchResult(best_move, score, current_depth, self.nodes, elapsed,
+                                  self._principal_variation(position, best_move, current_depth))
+            if on_info:
+                on_info(result)
+            # Searching deeper cannot improve on a forced mate
+            if abs(score) > MATE_THRESHOLD:
+                break
+            # Put the best move first for the next iteration
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _root_moves(self, position):
+        # Root moves in the order the first iteration tries them
+        return LegalMoveGenerator.generate(position, position.turn)
+
+    def _check_limits(self):
+        if self.stop_requested:
+            raise SearchStopped()
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchStopped()
+
+    def _search_root(self, position, moves, depth):
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            position.make_move(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.tt.store(position.zobrist_key, depth, EXACT, alpha, best_move)
+        return alpha, best_move
+
+    def _count_node(self):
+        self.nodes += 1
+        if self._node_limit is not None and self.nodes >= self._node_limit:
+            raise SearchStopped()
+        if not self.nodes & CHECK_INTERVAL:
+            self._check_limits()
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        if ply and self.tablebase is not None:
+            # Exact results also replace the quiescence search at the horizon
+            result = self.tablebase.probe(position)
+            if result is not None:
+                self._count_node()
+                wdl, plies = result
+                if wdl > 0:
+                    return MATE_SCORE - ply - plies
+                return -MATE_SCORE + ply + plies if wdl < 0 else 0
+        in_check = position.in_check()
+        # Check extension, so short forcing sequences are not cut off at the horizon
+        if in_check and ply < MAX_PLY:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(position, alpha, beta, ply)
+
+        self._count_node()
+        key = position.zobrist_key
+        # A position repeated once inside the game or the search is scored as
+        # a draw, as is one past the fifty-move limit
+        if ply and (position.repetitions[key] > 1 or position.halfmove_clock >= 100):
+            return 0
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = _score_from_tt(entry[3], ply)
+                flag = entry[2]
+                if (flag == EXACT or (flag == LOWER and score >= beta)
+                        or (flag == UPPER and score <= alpha)):
+                    return score
+
+        moves = LegalMoveGenerator.generate(position, position.turn)
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        for move in self._order_moves(position, moves, tt_move, ply):
+            captured = position.make_move(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not captured and not move >> 12:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[move & 4095] += depth * depth
+                        break
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, flag, _score_to_tt(best_score, ply), best_move)
+        return best_score
+
+    def _quiescence(self, position, alpha, beta, ply):
+        self._count_node()
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        board = position.board
+        captures = [move for move in LegalMoveGenerator.generate(position, position.turn)
+                    if board[move >> 6 & 63] or move >> 12 == QUEEN]
+        captures.sort(key=lambda move: self._capture_order(board, move), reverse=True)
+        best_score = stand_pat
+        for move in captures:
+            position.make_move(move)
+            score = -self._quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    @staticmethod
+    def _capture_order(board, move):
+        # MVV-LVA: most valuable victim first, cheapest attacker breaking ties.
+        # A promotion counts as winning the piece promoted to
+        victim = board[move >> 6 & 63]
+        attacker = board[move & 63]
+        gain = PIECE_VALUES[(victim - 1) % 6 + 1] + PIECE_VALUES[move >> 12]
+        return gain * 8 - (attacker - 1) % 6
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        board = position.board
+        killers = self.killers[ply]
+        history = self.history
+        capture_order = self._capture_order
+        scored = []
+        for move in moves:
+            if move == tt_move:
+                order = TT_MOVE_SCORE
+            elif board[move >> 6 & 63] or move >> 12:
+                order = CAPTURE_SCORE + capture_order(board, move)
+            elif move == killers[0]:
+                order = KILLER_SCORES[0]
+            elif move == killers[1]:
+                order = KILLER_SCORES[1]
+            else:
+                order = history[move & 4095]
+            scored.append((order, move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def _principal_variation(self, position, best_move, depth):
+        # Follow transposition table moves, checking each one is still legal
+        pv = [best_move]
+        position.make_move(best_move)
+        seen = {position.zobrist_key}
+        while len(pv) < depth:
+            entry = self.tt.probe(position.zobrist_key)
+            if entry is None or not entry[4]:
+                break
+            move = entry[4]
+            if move not in LegalMoveGenerator.generate(position, position.turn):
+                break
+            position.make_move(move)
+            pv.append(move)
+            if position.zobrist_key in seen:
+                break
+            seen.add(position.zobrist_key)
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+
+def position_from_moves(moves):
+    """Play a space separated list of UCI moves from the initial position"""
+    position = Position.initial()
+    for text in moves.split():
+        position.make_move(parse_uci(text))
+    return position
+
+
+# Fixed-depth benchmark positions, as move sequences from the initial position
+BENCH_POSITIONS = [
+    ('start', ''),
+    ('italian', 'e2e4 e7e5 g1f3 b8c6 f1c4 f8c5 c2c3 g8f6 d2d3 d7d6'),
+    ('queens gambit', 'd2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7 e2e3 b8d7'),
+    ('sicilian', 'e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6 c1e3 e7e5'),
+    ('open centre', 'e2e4 e7e5 d2d4 e5d4 d1d4 b8c6 d4e3 g8f6 b1c3 f8b4 c1d2'),
+]
+BENCH_DEPTH = 4
+# Minimum acceptable nodes per second for the benchmark to pass
+NPS_TARGET = 5000
+
+
+def bench(depth=BENCH_DEPTH, out=sys.stdout):
+    """Search every benchmark position to a fixed depth and return total nodes/s"""
+    total_nodes = 0
+    total_time = 0.0
+    for name, moves in BENCH_POSITIONS:
+        result = Search().search(position_from_moves(moves), depth=depth)
+        total_nodes += result.nodes
+        total_time += result.elapsed
+        out.write(f"{name:16} depth {result.depth}  nodes {result.nodes:9}  "
+                  f"nps {result.nps:7}  best {move_to_uci(result.best_move)}\n")
+    nps = int(total_nodes / total_time) if total_time > 0 else 0
+    out.write(f"{'total':16} nodes {total_nodes:9}  time {total_time:.2f}s  nps {nps}\n")
+    return nps
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fixed-depth search benchmark')
+    parser.add_argument('--depth', type=int, default=BENCH_DEPTH)
+    parser.add_argument('--target-nps', type=int, default=NPS_TARGET)
+    args = parser.parse_args()
+    nps = bench(args.depth)
+    if nps < args.target_nps:
+        print(f"FAIL: {nps} nodes/s is below the target of {args.target_nps}")
+        sys.exit(1)
@@ -0,0 +1,199 @@
+"""Static evaluation: material, piece-square tables, mobility, king safety
+and pawn structure.
+
+evaluate() scores one Position for the search. The NumPy version scoring
+many positions at once is in scripts/batch_evaluation.py, so the engine
+never imports NumPy.
+"""
+from scripts.constants import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from scripts.bitboard import KING_ATTACKS, PAWN_ATTACKS, iter_bits, popcount
+
+# Centipawn values indexed by piece kind; the king is never traded
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 0)
+
+# Piece-square tables from white's point of view, square 0 is a8 like in Position
+PIECE_SQUARE_TABLES = {
+    PAWN: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    KNIGHT: (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    BISHOP: (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    ROOK: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    QUEEN: (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    KING: (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+}
+
+
+def _piece_tables():
+    # Material plus placement per piece code, signed from white's point of view.
+    # Black reads the white table mirrored vertically (sq ^ 56 flips the row)
+    tables = [[0] * 64]
+    for color_sign, mirror in ((1, 0), (-1, 56)):
+        for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            table = PIECE_SQUARE_TABLES[kind]
+            tables.append([color_sign * (PIECE_VALUES[kind] + table[sq ^ mirror])
+                           for sq in range(64)])
+    return tables
+
+
+PIECE_TABLES = _piece_tables()
+
+# Centipawns per square a piece attacks that is not held by its own side
+MOBILITY_WEIGHTS = (0, 0, 4, 4, 2, 1, 0)
+# Per square next to the king attacked by the enemy
+KING_ZONE_PENALTY = 8
+# Per own pawn on the three squares in front of the king
+PAWN_SHIELD_BONUS = 10
+# Per pawn beyond the first on a file, and per pawn with no pawns on the files beside it
+DOUBLED_PAWN_PENALTY = 15
+ISOLATED_PAWN_PENALTY = 12
+# Passed pawn bonus by ranks advanced from the pawn's own back rank
+PASSED_PAWN_BONUS = (0, 5, 10, 20, 35, 60, 100, 0)
+
+# Mobility weight per piece code, signed from white's point of view
+MOBILITY_BY_CODE = tuple([0] + list(MOBILITY_WEIGHTS[1:]) + [-w for w in MOBILITY_WEIGHTS[1:]])
+
+FILE_MASKS = tuple(sum(1 << (row * 8 + col) for row in range(8)) for col in range(8))
+ADJACENT_FILE_MASKS = tuple((FILE_MASKS[col - 1] if col > 0 else 0) |
+                            (FILE_MASKS[col + 1] if col < 7 else 0) for col in range(8))
+
+
+def _passed_masks(color):
+    # Squares ahead of a pawn, on its own and the adjacent files, that enemy pawns must avoid
+    masks = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        rows = range(row) if color == WHITE else range(row + 1, 8)
+        masks.append(sum(1 << (r * 8 + c) for r in rows
+                         for c in (col - 1, col, col + 1) if 0 <= c < 8))
+    return masks
+
+
+def _shield_masks(color):
+    # The three squares one row in front of a king
+    step = -8 if color == WHITE else 8
+    return [PAWN_ATTACKS[color][sq] | (1 << (sq + step) if 0 <= sq + step < 64 else 0)
+            for sq in range(64)]
+
+
+PASSED_MASKS = (_passed_masks(WHITE), _passed_masks(BLACK))
+PAWN_SHIELDS = (_shield_masks(WHITE), _shield_masks(BLACK))
+# Passed pawn bonus per square; white pawns advance towards row 0
+PASSED_BONUS = (tuple(PASSED_PAWN_BONUS[7 - sq // 8] for sq in range(64)),
+                tuple(PASSED_PAWN_BONUS[sq // 8] for sq in range(64)))
+
+# Pawn structure only changes on pawn moves, so its score is cached by the pawn bitboards
+PAWN_CACHE_SIZE = 1 << 16
+_pawn_cache = {}
+
+
+def _pawn_side(pawns, enemy_pawns, color):
+    score = 0
+    for col in range(8):
+        count = popcount(pawns & FILE_MASKS[col])
+        if count:
+            score -= DOUBLED_PAWN_PENALTY * (count - 1)
+            if not pawns & ADJACENT_FILE_MASKS[col]:
+                score -= ISOLATED_PAWN_PENALTY * count
+    passed = PASSED_MASKS[color]
+    bonus = PASSED_BONUS[color]
+    for sq in iter_bits(pawns):
+        if not enemy_pawns & passed[sq]:
+            score += bonus[sq]
+    return score
+
+
+def pawn_structure(white_pawns, black_pawns):
+    """Doubled, isolated and passed pawns, from white's point of view"""
+    key = (white_pawns, black_pawns)
+    score = _pawn_cache.get(key)
+    if score is None:
+        score = (_pawn_side(white_pawns, black_pawns, WHITE) -
+                 _pawn_side(black_pawns, white_pawns, BLACK))
+        if len(_pawn_cache) >= PAWN_CACHE_SIZE:
+            _pawn_cache.clear()
+        _pawn_cache[key] = score
+    return score
+
+
+def king_safety(position, color_index):
+    """Pawn shield minus enemy pressure around one side's king"""
+    king = position.king_squares[color_index]
+    if king < 0:
+        return 0
+    shield = PAWN_SHIELDS[color_index][king] & position.bitboards[PAWN + 6 * color_index]
+    pressure = KING_ATTACKS[king] & position._attack_map(color_index ^ 1)
+    return PAWN_SHIELD_BONUS * popcount(shield) - KING_ZONE_PENALTY * popcount(pressure)
+
+
+def evaluate(position):
+    """Static evaluation in centipawns from the side to move's point of view"""
+    score = 0
+    bitboards = position.bitboards
+    attacks_from = position.attacks_from
+    occupied = position.occupied
+    for code in range(1, 13):
+        table = PIECE_TABLES[code]
+        weight = MOBILITY_BY_CODE[code]
+        if weight:
+            own = occupied[code > 6]
+            for sq in iter_bits(bitboards[code]):
+                score += table[sq] + weight * popcount(attacks_from[sq] & ~own)
+        else:
+            for sq in iter_bits(bitboards[code]):
+                score += table[sq]
+    score += pawn_structure(bitboards[PAWN], bitboards[PAWN + 6])
+    score += king_safety(position, WHITE) - king_safety(position, BLACK)
+    return -score if position.turn else score
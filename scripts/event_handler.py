@@ -5,4 +5,11 @@ class ChessEventHandler:
     def handle_square_click(square, event):
         if event.button() == Qt.LeftButton:
             board = square.parent().parent()
-            board.square_clicked(square)
\ No newline at end of file
+            board.square_clicked(square)
+
+    @staticmethod
+    def handle_board_click(board_widget, event):
+        if event.button() == Qt.LeftButton:
+            square = board_widget.square_at(event.pos())
+            if square:
+                board_widget.board.square_clicked(square)
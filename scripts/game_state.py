@@ -1,64 +1,101 @@
-from scripts.constants import BOARD_SIZE
-from scripts.rules import MoveRules
+from scripts.constants import BOARD_SIZE, COLORS
+from scripts.movegen import LegalMoveGenerator
+from scripts.move import move_from, move_to
 
 class GameState:
     @staticmethod
     def find_king(board, color):
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = board.get_piece_at(row, col)
-                if piece and piece.piece_type == 'king' and piece.color == color:
-                    return (row, col)
-        return None
+        king_sq = board.king_square(color)
+        if king_sq < 0:
+            return None
+        return divmod(king_sq, BOARD_SIZE)
 
     @staticmethod
     def is_check(board, color):
-        king_pos = GameState.find_king(board, color)
-        if not king_pos:
+        # The position tracks its king squares and attack maps incrementally,
+        # and keeps the attack maps until the board changes
+        king_sq = board.king_square(color)
+        if king_sq < 0:
             return False
 
         opponent_color = 'black' if color == 'white' else 'white'
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = board.get_piece_at(row, col)
-                if piece and piece.color == opponent_color:
-                    valid_moves = MoveRules.get_valid_moves(piece, (row, col), board)
-                    if king_pos in valid_moves:
-                        return True
-        return False
+        return board.is_square_attacked(king_sq, opponent_color)
+
+    @staticmethod
+    def zobrist_key(board):
+        """64-bit position key, maintained incrementally by the position"""
+        return board.zobrist_key
+
+    @staticmethod
+    def to_fen(board):
+        return board.to_fen()
+
+    @staticmethod
+    def set_fen(board, fen):
+        """Load a FEN string into an existing position without reallocating it"""
+        board.set_fen(fen)
+
+    @staticmethod
+    def legal_moves(board, color):
+        """Get every legal move of a color as packed ints"""
+        color_index = COLORS.index(color)
+        if color_index == board.turn:
+            # Served from the position's cache after the first call
+            return board.legal_moves()
+        return LegalMoveGenerator.generate(board, color_index)
+
+    @staticmethod
+    def get_piece_moves(board, color, start):
+        """Get the legal target squares of the piece on start"""
+        from_sq = start[0] * BOARD_SIZE + start[1]
+        targets = []
+        for move in GameState.legal_moves(board, color):
+            if move_from(move) == from_sq:
+                end = divmod(move_to(move), BOARD_SIZE)
+                # Promotions share a target square
+                if end not in targets:
+                    targets.append(end)
+        return targets
 
     @staticmethod
     def is_checkmate(board, color):
         if not GameState.is_check(board, color):
             return False
-
-        # Try all possible moves to see if any can get out of check
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = board.get_piece_at(row, col)
-                if piece and piece.color == color:
-                    valid_moves = MoveRules.get_valid_moves(piece, (row, col), board)
-                    for move in valid_moves:
-                        # Try move and see if still in check
-                        if not GameState.would_be_in_check(board, piece, (row, col), move):
-                            return False
-        return True
+        return not GameState.legal_moves(board, color)
 
     @staticmethod
     def is_stalemate(board, color):
         if GameState.is_check(board, color):
             return False
+        return not GameState.legal_moves(board, color)
 
-        # Check if any legal move exists
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = board.get_piece_at(row, col)
-                if piece and piece.color == color:
-                    valid_moves = MoveRules.get_valid_moves(piece, (row, col), board)
-                    for move in valid_moves:
-                        if not GameState.would_be_in_check(board, piece, (row, col), move):
-                            return False
-        return True
+    @staticmethod
+    def draw_reason(board):
+        """Why the game is drawn for the side to move, or None if it is not"""
+        if GameState.is_stalemate(board, board.current_player):
+            return 'stalemate'
+        if board.insufficient_material():
+            return 'insufficient material'
+        if board.repetition_count() >= 3:
+            return 'threefold repetition'
+        if board.halfmove_clock >= 100 and GameState.legal_moves(board, board.current_player):
+            # Checkmate on the hundredth halfmove still wins
+            return 'fifty-move rule'
+        return None
+
+    @staticmethod
+    def is_draw(board):
+        return GameState.draw_reason(board) is not None
+
+    @staticmethod
+    def result(board):
+        """PGN result of the position, * while the game goes on"""
+        color = board.current_player
+        if GameState.is_checkmate(board, color):
+            return '0-1' if color == 'white' else '1-0'
+        if GameState.is_draw(board):
+            return '1/2-1/2'
+        return '*'
 
     @staticmethod
     def would_be_in_check(board, piece, from_pos, to_pos):
@@ -70,15 +107,15 @@ class GameState:
         original_piece = board.get_piece_at(to_row, to_col)
 
         # Make temporary move
-        board.squares[to_row][to_col].piece = piece
-        board.squares[from_row][from_col].piece = None
+        board.set_piece_at(to_row, to_col, piece)
+        board.set_piece_at(from_row, from_col, None)
 
         # Check if in check
         in_check = GameState.is_check(board, piece.color)
 
         # Restore original position
-        board.squares[from_row][from_col].piece = piece
-        board.squares[to_row][to_col].piece = original_piece
+        board.set_piece_at(from_row, from_col, piece)
+        board.set_piece_at(to_row, to_col, original_piece)
 
         return in_check
 
@@ -86,39 +123,13 @@ class GameState:
     def get_defensive_moves(board, color):
         """Get all possible moves that can get out of check"""
         defensive_moves = []
-        king_pos = GameState.find_king(board, color)
-        if not king_pos:
-            return defensive_moves
-
-        # For each piece of the defending color
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = board.get_piece_at(row, col)
-                if piece and piece.color == color:
-                    # Get all valid moves for this piece
-                    valid_moves = MoveRules.get_valid_moves(piece, (row, col), board)
-                    # Filter moves that would get out of check
-                    for move in valid_moves:
-                        if not GameState.would_be_in_check(board, piece, (row, col), move):
-                            defensive_moves.append((piece, (row, col), move))
-        
+        for move in GameState.legal_moves(board, color):
+            start = divmod(move_from(move), BOARD_SIZE)
+            defensive_moves.append((board.get_piece_at(*start), start,
+                                    divmod(move_to(move), BOARD_SIZE)))
         return defensive_moves
 
     @staticmethod
     def get_legal_defensive_moves(board, color):
         """Get only the legal moves that can get out of check"""
-        legal_moves = []
-
-        # Find all possible defensive moves
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = board.get_piece_at(row, col)
-                if piece and piece.color == color:
-                    # Get valid moves for this piece
-                    valid_moves = MoveRules.get_valid_moves(piece, (row, col), board)
-                    # Check which moves actually get out of check
-                    for move in valid_moves:
-                        if not GameState.would_be_in_check(board, piece, (row, col), move):
-                            legal_moves.append(move)
-
-        return legal_moves
\ No newline at end of file
+        return [divmod(move_to(move), BOARD_SIZE) for move in GameState.legal_moves(board, color)]
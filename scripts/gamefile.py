@@ -0,0 +1,283 @@
+"""Binary game archive, compact on disk and read through a memory map.
+
+Layout, all little-endian:
+
+    header   magic (8 bytes) | game count (u32) | reserved (u32) | index offset (u64)
+    records  one per game, back to back
+    index    the offset of every record (u64 each)
+
+A record is
+
+    plies (u16) | result (u8) | flags (u8) | tags length (u16)
+    | [FEN length (u8) | FEN] | tags | moves (u16 each)
+
+where moves use the packed encoding of scripts/move.py, tags are UTF-8
+"name\\0value\\0" pairs and bit 0 of flags marks a game that starts from a
+FEN. Reading game n touches one index entry and one record however large
+the archive is, and a position inside a game is found by replaying its
+moves, so nothing else is parsed.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from scripts.pgn import PGNGame, RESULTS, read_games, parse_san, move_to_san, write_game
+from scripts.position import Position
+
+MAGIC = b'CPGF\x00\x00\x00\x01'
+HEADER = struct.Struct('<8sIIQ')
+RECORD = struct.Struct('<HBBH')
+OFFSET = struct.Struct('<Q')
+HAS_FEN = 1
+# Plies and bytes of encoded tags a record can hold
+MAX_PLIES = 0xFFFF
+MAX_TAGS_LENGTH = 0xFFFF
+ARCHIVE_EXTENSION = '.cgf'
+
+
+def _little_endian(values):
+    # Arrays are in host byte order, the file is little-endian
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def _encode_tags(headers):
+    return b''.join(f"{name}\0{value}\0".encode() for name, value in headers.items())
+
+
+def _decode_tags(data):
+    fields = data.decode().split('\0')[:-1]
+    return dict(zip(fields[::2], fields[1::2]))
+
+
+class GameRecord:
+    """One game read from an archive, with its moves as packed ints"""
+    __slots__ = ('headers', 'moves', 'result', 'fen')
+
+    def __init__(self, headers, moves, result='*', fen=None):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+        self.fen = fen
+
+    def start_position(self):
+        return Position.from_fen(self.fen) if self.fen else Position.initial()
+
+    def position_at(self, ply):
+        """The position after the first ply moves"""
+        if not 0 <= ply <= len(self.moves):
+            raise IndexError(f"Ply {ply} is outside a game of {len(self.moves)} plies")
+        position = self.start_position()
+        for move in self.moves[:ply]:
+            position.make_move(move)
+        return position
+
+    def to_pgn(self):
+        """The game as a PGNGame with SAN moves"""
+        position = self.start_position()
+        sans = []
+        for move in self.moves:
+            sans.append(move_to_san(position, move))
+            position.make_move(move)
+        headers = dict(self.headers)
+        if self.fen:
+            headers.update(SetUp='1', FEN=self.fen)
+        return PGNGame(headers, sans, self.result)
+
+
+class GameArchiveWriter:
+    """Write games to a new archive; the index is written by close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, 0, 0, 0))
+        self.offsets = array('Q')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, moves, headers=None, result='*', fen=None):
+        """Append a game of packed moves, returning its number"""
+        if len(moves) > MAX_PLIES:
+            raise ValueError(f"Games are limited to {MAX_PLIES} plies")
+        tags = _encode_tags(headers or {})
+        if len(tags) > MAX_TAGS_LENGTH:
+            raise ValueError(f"Game tags are limited to {MAX_TAGS_LENGTH} bytes")
+        record = RECORD.pack(len(moves), RESULTS.index(result), HAS_FEN if fen else 0, len(tags))
+        if fen:
+            fen_bytes = fen.encode()
+            record += bytes([len(fen_bytes)]) + fen_bytes
+        self.offsets.append(self._file.tell())
+        self._file.write(record + tags)
+        self._file.write(_little_endian(array('H', moves)).tobytes())
+        return len(self.offsets) - 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(_little_endian(self.offsets).tobytes())
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, len(self.offsets), 0, index_offset))
+        self._file.close()
+
+
+class GameArchive:
+    """Read-only view of an archive file; use as a context manager or close()"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        header = self._file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            self._file.close()
+            raise ValueError(f"Not a game archive: {path}")
+        magic, self.count, _, self._index = HEADER.unpack(header)
+        if magic != MAGIC or not self._index or self._index + 8 * self.count > size:
+            self._file.close()
+            raise ValueError(f"Not a game archive, or one that was never closed: {path}")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _record(self, n):
+        # (plies, result, FEN or None, tags slice, offset of the moves)
+        if not 0 <= n < self.count:
+            raise IndexError(f"Game {n} is outside an archive of {self.count} games")
+        data = self._map
+        offset = OFFSET.unpack_from(data, self._index + 8 * n)[0]
+        plies, result, flags, tags_length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        fen = None
+        if flags & HAS_FEN:
+            fen_length = data[offset]
+            fen = data[offset + 1:offset + 1 + fen_length].decode()
+            offset += 1 + fen_length
+        tags = (offset, offset + tags_length)
+        return plies, RESULTS[result], fen, tags, offset + tags_length
+
+    def _moves(self, start, plies):
+        moves = array('H')
+        moves.frombytes(self._map[start:start + 2 * plies])
+        return _little_endian(moves)
+
+    def game(self, n):
+        """Game n (from 0) as a GameRecord"""
+        plies, result, fen, (tags_start, tags_end), moves_start = self._record(n)
+        return GameRecord(_decode_tags(self._map[tags_start:tags_end]),
+                          self._moves(moves_start, plies).tolist(), result, fen)
+
+    def __iter__(self):
+        for n in range(self.count):
+            yield self.game(n)
+
+    def position_at(self, n, ply):
+        """The position after ply moves of game n, reading only those moves"""
+        plies, _, fen, _, moves_start = self._record(n)
+        if not 0 <= ply <= plies:
+            raise IndexError(f"Ply {ply} is outside a game of {plies} plies")
+        position = Position.from_fen(fen) if fen else Position.initial()
+        for move in self._moves(moves_start, ply):
+            position.make_move(move)
+        return position
+
+
+def record_from_pgn(game):
+    """Resolve the SAN moves of a PGNGame, raising ValueError on an illegal one"""
+    headers = dict(game.headers)
+    fen = headers.pop('FEN', None)
+    headers.pop('SetUp', None)
+    position = Position.from_fen(fen) if fen else Position.initial()
+    moves = []
+    for san in game.moves:
+        move = parse_san(position, san)
+        position.make_move(move)
+        moves.append(move)
+    return GameRecord(headers, moves, game.result, fen)
+
+
+def pgn_to_archive(stream, path):
+    """Convert a PGN stream into an archive, returning (games written, games skipped).
+
+    Games with an illegal or unreadable move are skipped whole.
+    """
+    skipped = 0
+    with GameArchiveWriter(path) as writer:
+        for game in read_games(stream):
+            try:
+                record = record_from_pgn(game)
+                writer.add(record.moves, record.headers, record.result, record.fen)
+            except ValueError:
+                skipped += 1
+        return len(writer), skipped
+
+
+def archive_to_pgn(archive, out):
+    """Write every game of an open archive as PGN, returning the game count"""
+    for record in archive:
+        write_game(out, record.to_pgn())
+    return len(archive)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Convert and inspect binary game archives')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('import', help='convert PGN games into an archive')
+    convert.add_argument('pgn', help="PGN file, or '-' for stdin")
+    convert.add_argument('archive')
+    export = commands.add_parser('export', help='write an archive as PGN')
+    export.add_argument('archive')
+    export.add_argument('pgn', nargs='?', default='-', help="PGN file, or '-' for stdout")
+    show = commands.add_parser('show', help='print a game, or the position at a ply')
+    show.add_argument('archive')
+    show.add_argument('game', type=int, help='game number, from 1')
+    show.add_argument('--ply', type=int, help='print the FEN after this many plies')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        start = time.perf_counter()
+        stream = sys.stdin if args.pgn == '-' else open(args.pgn, encoding='utf-8',
+                                                        errors='replace')
+        with stream:
+            written, skipped = pgn_to_archive(stream, args.archive)
+        size = os.path.getsize(args.archive)
+        print(f"{written} games written, {skipped} skipped, {size} bytes "
+              f"({size / max(written, 1):.0f} per game), {time.perf_counter() - start:.1f}s")
+    elif args.command == 'export':
+        with GameArchive(args.archive) as archive:
+            if args.pgn == '-':
+                archive_to_pgn(archive, sys.stdout)
+            else:
+                with open(args.pgn, 'w', encoding='utf-8') as out:
+                    archive_to_pgn(archive, out)
+    else:
+        with GameArchive(args.archive) as archive:
+            if args.ply is not None:
+                print(archive.position_at(args.game - 1, args.ply).to_fen())
+            else:
+                write_game(sys.stdout, archive.game(args.game - 1).to_pgn())
@@ -0,0 +1,44 @@
+from scripts.constants import BOARD_SIZE, KNIGHT, BISHOP, ROOK, QUEEN
+
+# A move is packed into 16 bits: from square, to square and promotion piece kind
+FILES = 'abcdefgh'
+PROMOTION_LETTERS = {KNIGHT: 'n', BISHOP: 'b', ROOK: 'r', QUEEN: 'q'}
+LETTER_PROMOTIONS = {letter: kind for kind, letter in PROMOTION_LETTERS.items()}
+
+
+def encode_move(from_sq, to_sq, promotion=0):
+    return from_sq | to_sq << 6 | promotion << 12
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def square_name(sq):
+    row, col = divmod(sq, BOARD_SIZE)
+    return f"{FILES[col]}{BOARD_SIZE - row}"
+
+
+def parse_square(name):
+    return (BOARD_SIZE - int(name[1])) * BOARD_SIZE + FILES.index(name[0])
+
+
+def move_to_uci(move):
+    promotion = move_promotion(move)
+    suffix = PROMOTION_LETTERS[promotion] if promotion else ''
+    return square_name(move_from(move)) + square_name(move_to(move)) + suffix
+
+
+def parse_uci(text):
+    if len(text) not in (4, 5) or (len(text) == 5 and text[4].lower() not in LETTER_PROMOTIONS):
+        raise ValueError(f"Invalid move: {text}")
+    promotion = LETTER_PROMOTIONS[text[4].lower()] if len(text) == 5 else 0
+    return encode_move(parse_square(text[0:2]), parse_square(text[2:4]), promotion)
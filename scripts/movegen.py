@@ -0,0 +1,152 @@
+from scripts.constants import (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE_KINGSIDE,
+                               WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)
+from scripts.bitboard import (FULL, BETWEEN, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+                              ROOK_RAYS, BISHOP_RAYS, rook_attacks, bishop_attacks,
+                              pawn_pushes, iter_bits)
+
+# Promotion piece kinds, best first so move ordering sees queens early
+PROMOTIONS = (QUEEN, KNIGHT, ROOK, BISHOP)
+# Back ranks where pawns promote, as bitboards indexed by color
+PROMOTION_RANKS = (0xFF, 0xFF << 56)
+# Castling (right, king target, squares that must be empty, squares the king
+# crosses) per color
+CASTLING_PATHS = (
+    ((WHITE_KINGSIDE, 62, 0x60 << 56, (61, 62)),
+     (WHITE_QUEENSIDE, 58, 0x0E << 56, (59, 58))),
+    ((BLACK_KINGSIDE, 6, 0x60, (5, 6)),
+     (BLACK_QUEENSIDE, 2, 0x0E, (3, 2))),
+)
+
+
+class LegalMoveGenerator:
+    """Strictly legal move generation for a Position.
+
+    Pinned pieces and the squares that resolve a check are computed once per
+    position, so no candidate move has to be played and tested afterwards.
+    En passant is the one exception: removing two pawns from a rank can
+    expose the king in ways a pin does not describe, so it is checked by
+    recomputing the attackers with the resulting occupancy.
+    Moves are packed ints, see scripts/move.py.
+    """
+
+    @staticmethod
+    def attackers_to(board, sq, color, occupied):
+        """Bitboard of the pieces of a color attacking sq, given an occupancy"""
+        bitboards = board.bitboards
+        offset = 6 * color
+        queens = bitboards[QUEEN + offset]
+        return (PAWN_ATTACKS[color ^ 1][sq] & bitboards[PAWN + offset] |
+                KNIGHT_ATTACKS[sq] & bitboards[KNIGHT + offset] |
+                KING_ATTACKS[sq] & bitboards[KING + offset] |
+                bishop_attacks(sq, occupied) & (bitboards[BISHOP + offset] | queens) |
+                rook_attacks(sq, occupied) & (bitboards[ROOK + offset] | queens))
+
+    @staticmethod
+    def pins(board, color):
+        """Return {pinned square: squares it may still move to} for a color"""
+        king = board.king_squares[color]
+        pins = {}
+        if king < 0:
+            return pins
+        bitboards = board.bitboards
+        offset = 6 * (color ^ 1)
+        queens = bitboards[QUEEN + offset]
+        own = board.occupied[color]
+        occupied = own | board.occupied[color ^ 1]
+        snipers = (ROOK_RAYS[king] & (bitboards[ROOK + offset] | queens) |
+                   BISHOP_RAYS[king] & (bitboards[BISHOP + offset] | queens))
+        between_king = BETWEEN[king]
+        for sniper in iter_bits(snipers):
+            blockers = between_king[sniper] & occupied
+            # Exactly one piece in between, and it is ours
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pins[blockers.bit_length() - 1] = between_king[sniper] | 1 << sniper
+        return pins
+
+    @staticmethod
+    def generate(board, color):
+        moves = []
+        append = moves.append
+        bitboards = board.bitboards
+        own = board.occupied[color]
+        enemy = board.occupied[color ^ 1]
+        occupied = own | enemy
+        not_own = ~own & FULL
+        offset = 6 * color
+        king = board.king_squares[color]
+
+        check_mask = FULL
+        checkers = 0
+        pins = {}
+        if king >= 0:
+            attackers_to = LegalMoveGenerator.attackers_to
+            them = color ^ 1
+
+            # King moves are tested with the king lifted off the board so it
+            # cannot hide behind itself from a slider
+            without_king = occupied ^ 1 << king
+            for to_sq in iter_bits(KING_ATTACKS[king] & not_own):
+                if not attackers_to(board, to_sq, them, without_king):
+                    append(king | to_sq << 6)
+
+            checkers = attackers_to(board, king, them, occupied)
+            if checkers:
+                if checkers & (checkers - 1):
+                    # Double check, only the king can move
+                    return moves
+                checker = checkers.bit_length() - 1
+                check_mask = BETWEEN[king][checker] | checkers
+            pins = LegalMoveGenerator.pins(board, color)
+
+            if not checkers and board.castling:
+                for right, target, empty, path in CASTLING_PATHS[color]:
+                    if (board.castling & right and not occupied & empty and
+                            not any(attackers_to(board, sq, them, occupied) for sq in path)):
+                        append(king | target << 6)
+
+        pawns = bitboards[PAWN + offset]
+        pawn_attacks = PAWN_ATTACKS[color]
+        promotion_rank = PROMOTION_RANKS[color]
+        for sq in iter_bits(pawns):
+            targets = (pawn_pushes(sq, color, occupied) | pawn_attacks[sq] & enemy) & check_mask
+            if sq in pins:
+                targets &= pins[sq]
+            while targets:
+                low = targets & -targets
+                move = sq | (low.bit_length() - 1) << 6
+                if low & promotion_rank:
+                    for kind in PROMOTIONS:
+                        append(move | kind << 12)
+                else:
+                    append(move)
+                targets ^= low
+
+        ep_square = board.ep_square
+        # The en passant square only belongs to the side to move
+        if ep_square >= 0 and color == board.turn:
+            captured_sq = ep_square + 8 if color == 0 else ep_square - 8
+            for sq in iter_bits(PAWN_ATTACKS[color ^ 1][ep_square] & pawns):
+                # Play it on the occupancy and see whether anything reaches the king
+                after = occupied ^ (1 << sq | 1 << captured_sq | 1 << ep_square)
+                if king < 0 or not (LegalMoveGenerator.attackers_to(board, king, color ^ 1, after)
+                                    & ~(1 << captured_sq)):
+                    append(sq | ep_square << 6)
+
+        for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+            for sq in iter_bits(bitboards[kind + offset]):
+                if kind == KNIGHT:
+                    targets = KNIGHT_ATTACKS[sq]
+                elif kind == BISHOP:
+                    targets = bishop_attacks(sq, occupied)
+                elif kind == ROOK:
+                    targets = rook_attacks(sq, occupied)
+                else:
+                    targets = rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+                targets &= not_own & check_mask
+                if sq in pins:
+                    targets &= pins[sq]
+                while targets:
+                    low = targets & -targets
+                    append(sq | (low.bit_length() - 1) << 6)
+                    targets ^= low
+        return moves
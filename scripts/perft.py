@@ -0,0 +1,92 @@
+import sys
+import time
+from scripts.movegen import LegalMoveGenerator
+from scripts.move import move_to_uci
+from scripts.position import Position, START_FEN
+
+# Reference positions with their published leaf counts per depth
+PERFT_SUITE = [
+    ('start', START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+]
+
+
+def perft(position, depth):
+    """Count the leaf nodes of the legal move tree to the given depth"""
+    moves = LegalMoveGenerator.generate(position, position.turn)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    """Return the perft count below every legal root move, keyed by UCI move"""
+    counts = {}
+    for move in LegalMoveGenerator.generate(position, position.turn):
+        position.make_move(move)
+        counts[move_to_uci(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+
+def run_suite(max_depth=None, out=sys.stdout):
+    """Run every reference position and report counts and nodes/s.
+
+    Returns True when every count matches its reference.
+    """
+    passed = True
+    for name, fen, expected in PERFT_SUITE:
+        position = Position.from_fen(fen)
+        for depth, reference in sorted(expected.items()):
+            if max_depth is not None and depth > max_depth:
+                break
+            start = time.perf_counter()
+            nodes = perft(position, depth)
+            elapsed = time.perf_counter() - start
+            nps = int(nodes / elapsed) if elapsed > 0 else 0
+            status = 'ok' if nodes == reference else f'FAIL (expected {reference})'
+            passed = passed and nodes == reference
+            out.write(f"{name:12} depth {depth}  nodes {nodes:10}  "
+                      f"{elapsed:7.2f}s  nps {nps:8}  {status}\n")
+    return passed
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Move generator perft counts')
+    parser.add_argument('--fen', help='position to count instead of running the suite')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true',
+                        help='print the count below every root move')
+    parser.add_argument('--max-depth', type=int,
+                        help='skip suite entries deeper than this')
+    args = parser.parse_args()
+
+    if args.fen:
+        position = Position.from_fen(args.fen)
+        start = time.perf_counter()
+        if args.divide:
+            counts = divide(position, args.depth)
+            for move, nodes in sorted(counts.items()):
+                print(f"{move}: {nodes}")
+            total = sum(counts.values())
+        else:
+            total = perft(position, args.depth)
+        elapsed = time.perf_counter() - start
+        nps = int(total / elapsed) if elapsed > 0 else 0
+        print(f"nodes {total}  time {elapsed:.2f}s  nps {nps}")
+    elif not run_suite(args.max_depth):
+        sys.exit(1)
@@ -0,0 +1,305 @@
+import re
+import sys
+import time
+from collections import deque
+from scripts.constants import BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from scripts.game_state import GameState
+from scripts.move import FILES, move_from, move_to, move_promotion, parse_square, square_name
+from scripts.position import Position
+
+SAN_PIECES = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+SAN_LETTERS = {kind: letter for letter, kind in SAN_PIECES.items()}
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+MOVE_NUMBER = re.compile(r'^\d+\.+')
+# Tags every exported game carries, in this order, with their unknown values
+SEVEN_TAG_ROSTER = (('Event', '?'), ('Site', '?'), ('Date', '????.??.??'), ('Round', '?'),
+                    ('White', '?'), ('Black', '?'), ('Result', '*'))
+LINE_LENGTH = 79
+
+
+class PGNGame:
+    __slots__ = ('headers', 'moves', 'result')
+
+    def __init__(self, headers, moves, result):
+        self.headers = headers
+        self.moves = moves  # SAN strings
+        self.result = result
+
+    def start_position(self):
+        if 'FEN' in self.headers:
+            return Position.from_fen(self.headers['FEN'])
+        return Position.initial()
+
+
+def _movetext_tokens(text, state):
+    # state carries comment and variation nesting across lines
+    token = ''
+    for char in text:
+        if state['comment']:
+            if char == '}':
+                state['comment'] = False
+            continue
+        if char == '{':
+            state['comment'] = True
+        elif char == '(':
+            state['variation'] += 1
+        elif char == ')':
+            state['variation'] = max(0, state['variation'] - 1)
+        elif char == ';' and not state['variation']:
+            break
+        elif state['variation']:
+            continue
+        elif char.isspace():
+            if token:
+                yield token
+            token = ''
+            continue
+        else:
+            token += char
+            continue
+        if token:
+            yield token
+        token = ''
+    if token and not state['comment'] and not state['variation']:
+        yield token
+
+
+def read_games(stream):
+    """Yield a PGNGame for every game in a text stream, one game in memory at a time"""
+    headers = {}
+    moves = []
+    result = None
+    state = {'comment': False, 'variation': 0}
+    in_movetext = False
+
+    for line in stream:
+        line = line.strip()
+        if not state['comment'] and not state['variation'] and line.startswith('['):
+            if in_movetext:
+                # A tag after movetext starts the next game even without a result
+                yield PGNGame(headers, moves, result or '*')
+                headers, moves, result = {}, [], None
+                in_movetext = False
+            match = TAG_PATTERN.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+            continue
+        if not line or line.startswith('%'):
+            continue
+
+        in_movetext = True
+        for token in _movetext_tokens(line, state):
+            if token in RESULTS:
+                result = token
+                yield PGNGame(headers, moves, result)
+                headers, moves, result = {}, [], None
+                in_movetext = False
+                continue
+            token = MOVE_NUMBER.sub('', token)
+            if token and not token.startswith('$'):
+                moves.append(token)
+
+    if in_movetext or moves:
+        yield PGNGame(headers, moves, result or '*')
+
+
+def parse_san(position, san):
+    """Resolve a SAN move to the packed legal move it denotes"""
+    text = san.rstrip('+#!?')
+    moves = GameState.legal_moves(position, position.current_player)
+
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king = position.king_squares[position.turn]
+        target = king + (2 if len(text) == 3 else -2)
+        for move in moves:
+            if move_from(move) == king and move_to(move) == target:
+                return move
+        raise ValueError(f"Illegal move: {san}")
+
+    match = SAN_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid move: {san}")
+    letter, from_file, from_rank, target, promotion = match.groups()
+    kind = SAN_PIECES[letter] if letter else PAWN
+    to_sq = parse_square(target)
+    promotion = SAN_PIECES[promotion] if promotion else 0
+    from_col = 'abcdefgh'.index(from_file) if from_file else None
+    from_row = 8 - int(from_rank) if from_rank else None
+
+    board = position.board
+    candidates = []
+    for move in moves:
+        from_sq = move_from(move)
+        if (move_to(move) == to_sq and (board[from_sq] - 1) % 6 + 1 == kind
+                and move_promotion(move) == promotion
+                and (from_col is None or from_sq % 8 == from_col)
+                and (from_row is None or from_sq // 8 == from_row)):
+            candidates.append(move)
+    if not candidates:
+        raise ValueError(f"Illegal move: {san}")
+    if len(candidates) > 1:
+        raise ValueError(f"Ambiguous move: {san}")
+    return candidates[0]
+
+
+def move_to_san(position, move):
+    """SAN of a legal move in a position, with + or # when it gives check or mate"""
+    from_sq = move_from(move)
+    to_sq = move_to(move)
+    board = position.board
+    piece = board[from_sq]
+    kind = (piece - 1) % 6 + 1
+    if kind == KING and abs(to_sq - from_sq) == 2:
+        san = 'O-O' if to_sq > from_sq else 'O-O-O'
+    else:
+        capture = 'x' if board[to_sq] or (kind == PAWN and to_sq == position.ep_square) else ''
+        if kind == PAWN:
+            san = (FILES[from_sq % 8] if capture else '') + capture + square_name(to_sq)
+            if move_promotion(move):
+                san += '=' + SAN_LETTERS[move_promotion(move)]
+        else:
+            # Name the file, else the rank, else both when another such piece could go there
+            rivals = [move_from(other) for other in position.legal_moves()
+                      if move_to(other) == to_sq and move_from(other) != from_sq
+                      and board[move_from(other)] == piece]
+            origin = ''
+            if rivals:
+                name = square_name(from_sq)
+                if all(rival % 8 != from_sq % 8 for rival in rivals):
+                    origin = name[0]
+                elif all(rival // 8 != from_sq // 8 for rival in rivals):
+                    origin = name[1]
+                else:
+                    origin = name
+            san = SAN_LETTERS[kind] + origin + capture + square_name(to_sq)
+    position.make_move(move)
+    if position.in_check():
+        san += '+' if position.legal_moves() else '#'
+    position.unmake_move()
+    return san
+
+
+def write_game(out, game):
+    """Write a PGNGame as PGN text, numbering moves from its start position"""
+    headers = dict(game.headers)
+    headers['Result'] = game.result
+    for name, unknown in SEVEN_TAG_ROSTER:
+        out.write(f'[{name} "{headers.pop(name, unknown)}"]\n')
+    for name, value in headers.items():
+        out.write(f'[{name} "{value}"]\n')
+    out.write('\n')
+
+    position = game.start_position()
+    number = position.fullmove_number
+    black = position.turn == BLACK
+    tokens = []
+    for san in game.moves:
+        if not black:
+            tokens.append(f"{number}.")
+        elif not tokens:
+            tokens.append(f"{number}...")
+        tokens.append(san)
+        if black:
+            number += 1
+        black = not black
+    tokens.append(game.result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            out.write(line + '\n')
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    out.write(line + '\n\n')
+
+
+def replay_game(game):
+    """Replay a game through the rules and report whether every move was legal"""
+    result = {'white': game.headers.get('White', '?'), 'black': game.headers.get('Black', '?'),
+              'result': game.result, 'moves': 0, 'valid': True, 'error': None}
+    try:
+        position = game.start_position()
+    except ValueError as error:
+        result.update(valid=False, error=str(error))
+        return result
+    for san in game.moves:
+        try:
+            move = parse_san(position, san)
+        except ValueError as error:
+            result.update(valid=False, error=f"ply {result['moves'] + 1}: {error}")
+            return result
+        position.make_move(move)
+        result['moves'] += 1
+    return result
+
+
+def _replay_chunk(games):
+    return [replay_game(game) for game in games]
+
+
+def _chunks(games, chunk_size):
+    chunk = []
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_games(stream, workers=None, chunk_size=100):
+    """Replay every game of a PGN stream across a process pool.
+
+    Yields one result per game, in file order. Only a bounded number of
+    chunks is in flight at once, so memory stays flat however large the
+    input is.
+    """
+    from multiprocessing import Pool, cpu_count
+
+    workers = workers or cpu_count()
+    chunks = _chunks(read_games(stream), chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from _replay_chunk(chunk)
+        return
+
+    with Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_replay_chunk, (chunk,)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Validate PGN games against the rules')
+    parser.add_argument('pgn', help="PGN file, or '-' for stdin")
+    parser.add_argument('--workers', type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=100, help='games per task')
+    parser.add_argument('--errors', action='store_true', help='print every invalid game')
+    args = parser.parse_args()
+
+    stream = sys.stdin if args.pgn == '-' else open(args.pgn, encoding='utf-8', errors='replace')
+    games = valid = moves = 0
+    start = time.perf_counter()
+    with stream:
+        for result in validate_games(stream, args.workers, args.chunk_size):
+            games += 1
+            moves += result['moves']
+            if result['valid']:
+                valid += 1
+            elif args.errors:
+                print(f"game {games} ({result['white']} - {result['black']}): {result['error']}")
+    elapsed = time.perf_counter() - start
+    print(f"games {games}  valid {valid}  invalid {games - valid}  moves {moves}  "
+          f"time {elapsed:.2f}s")
+    if elapsed > 0:
+        print(f"{games / elapsed:.1f} games/s  {moves / elapsed:.1f} moves/s")
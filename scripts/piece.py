@@ -3,12 +3,41 @@ from PyQt5.QtGui import QPixmap
 from PyQt5.QtCore import Qt
 from scripts.constants import BOARD_SIZE, DIRECTIONS
 
+PIECE_SIZE = 60
+
+
+class PixmapCache:
+    """Process-wide piece images, decoded once and scaled once per size"""
+    _sources = {}
+    _scaled = {}
+
+    @staticmethod
+    def get(color, piece_type, size):
+        key = (color, piece_type, size)
+        pixmap = PixmapCache._scaled.get(key)
+        if pixmap is None:
+            source = PixmapCache._sources.get((color, piece_type))
+            if source is None:
+                # Image path format: 'images/{color}_{piece}.png'
+                source = QPixmap(f"images/{color}_{piece_type}.png")
+                PixmapCache._sources[(color, piece_type)] = source
+            pixmap = source.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            PixmapCache._scaled[key] = pixmap
+        return pixmap
+
+    @staticmethod
+    def invalidate():
+        """Drop scaled images, e.g. when the board is resized"""
+        PixmapCache._scaled.clear()
+
+
 class ChessPiece(QLabel):
     def __init__(self, piece_type, color, parent=None):
         super().__init__(parent)
         self.piece_type = piece_type
         self.color = color  # 'white' or 'black'
         self.has_moved = False
+        self.pixmap_size = None
         
         # Load piece image
         self.load_image()
@@ -19,16 +48,20 @@ class ChessPiece(QLabel):
     def setParent(self, parent):
         super().setParent(parent)
         if parent:
-            # Reload and rescale image when parent changes
-            self.load_image()
+            # Only rescale when the new square has a different size
+            if self.image_size() != self.pixmap_size:
+                self.load_image()
             self.show()  # Make sure piece is visible
+
+    def image_size(self):
+        parent = self.parent()
+        if parent:
+            return min(parent.width(), parent.height())
+        return PIECE_SIZE
     
     def load_image(self):
-        # Image path format: 'images/{color}_{piece}.png'
-        image_path = f"images/{self.color}_{self.piece_type}.png"
-        pixmap = QPixmap(image_path)
-        scaled_pixmap = pixmap.scaled(60, 60, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.setPixmap(scaled_pixmap)
+        self.pixmap_size = self.image_size()
+        self.setPixmap(PixmapCache.get(self.color, self.piece_type, self.pixmap_size))
         self.setAlignment(Qt.AlignCenter)
     
     def mousePressEvent(self, event):
@@ -148,4 +181,13 @@ class King(ChessPiece):
             if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
                 moves.append((r, c))
                 
-        return moves
\ No newline at end of file
+        return moves
+
+PIECE_CLASSES = {
+    'pawn': Pawn,
+    'rook': Rook,
+    'knight': Knight,
+    'bishop': Bishop,
+    'queen': Queen,
+    'king': King,
+}
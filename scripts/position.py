@@ -0,0 +1,523 @@
+from array import array
+from scripts.constants import (BOARD_SIZE, WHITE, BLACK, COLORS, PIECE_TYPES, EMPTY,
+                               PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, CASTLING_LETTERS,
+                               WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)
+from scripts.bitboard import (piece_attacks, rook_attacks, bishop_attacks, iter_bits,
+                              popcount, PAWN_ATTACKS)
+from scripts.movegen import LegalMoveGenerator
+from scripts.zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS, compute_key
+
+
+class Piece:
+    """Immutable piece descriptor shared by every square holding the same piece"""
+    __slots__ = ('code', 'kind', 'color_index', 'piece_type', 'color')
+
+    def __init__(self, code):
+        self.code = code
+        self.kind = (code - 1) % 6 + 1
+        self.color_index = WHITE if code <= 6 else BLACK
+        self.piece_type = PIECE_TYPES[self.kind]
+        self.color = COLORS[self.color_index]
+
+    def __repr__(self):
+        return f"Piece({self.color}, {self.piece_type})"
+
+
+# Index 0 is the empty square so PIECES[code] never needs a branch
+PIECES = (None,) + tuple(Piece(code) for code in range(1, 13))
+
+
+def square_index(row, col):
+    return row * BOARD_SIZE + col
+
+
+# FEN letter of each piece code
+PIECE_LETTERS = '.PNBRQKpnbrqk'
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# Initial size of the undo stack, in moves
+HISTORY_CAPACITY = 256
+# Rows 0 and 7, where no pawn can stand
+BACK_RANKS = 0xFF | 0xFF << 56
+
+# Castling rights kept after a move touching a square; moving the king or a
+# rook, or capturing a rook on its home square, clears the matching rights
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[4] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[0] = 15 & ~BLACK_QUEENSIDE
+CASTLING_MASKS[7] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASKS[60] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[56] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASKS[63] = 15 & ~WHITE_KINGSIDE
+# Castling rook (from, to) squares keyed by the king's target square
+CASTLING_ROOKS = {62: (63, 61), 58: (56, 59), 6: (7, 5), 2: (0, 3)}
+# Bitboard of the light squares, a8 (square 0) being light
+LIGHT_SQUARES = sum(1 << sq for sq in range(64) if (sq // 8 + sq % 8) % 2 == 0)
+
+
+class Position:
+    """Qt-free chess position stored as a flat array of 64 piece codes.
+
+    Squares are numbered row * 8 + col with row 0 being black's back rank,
+    matching the (row, col) coordinates used by ChessBoard. A bitboard per
+    piece code and an occupancy bitboard per color are kept alongside the
+    array for the bitboard move generator.
+
+    The squares attacked by each piece are updated incrementally as pieces
+    are placed and removed, together with the king squares, so attack
+    queries never rescan the board. The same goes for the Zobrist key, see
+    scripts/zobrist.py.
+
+    Castling rights are a KQkq bitmask and the en passant square is only set
+    when a pawn of the side to move can actually capture there, so positions
+    that differ only by a useless en passant square hash the same.
+
+    Every move played pushes a packed undo record (move, captured piece,
+    prior castling rights, en passant square and halfmove clock) and the
+    prior Zobrist key onto preallocated arrays, so unmake_move restores the
+    position exactly and takebacks are always possible.
+
+    A table of how often every key has occurred since the last pawn move
+    or capture is kept along with the stack, so repetitions are found
+    without walking the history. Earlier positions cannot come back, so
+    the table restarts with every such move and its size is bounded by the
+    fifty-move rule; taking the move back rebuilds the previous table from
+    the keys on the stack.
+
+    The legal moves of the side to move are generated at most once per
+    Zobrist key, so the GUI can ask for them on every click for free.
+    """
+    __slots__ = ('board', 'turn', 'castling', 'ep_square', 'halfmove_clock',
+                 'fullmove_number', 'bitboards', 'occupied', 'king_squares', 'attacks_from',
+                 '_attack_maps', 'zobrist_key', 'ply', '_undo_records', '_undo_keys',
+                 'repetitions', '_legal_cache')
+
+    def __init__(self):
+        self.board = array('b', bytes(BOARD_SIZE * BOARD_SIZE))
+        self.turn = WHITE
+        self.castling = 0
+        # Square a pawn may capture en passant on, or -1
+        self.ep_square = -1
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.zobrist_key = 0
+        self.bitboards = [0] * 13
+        self.occupied = [0, 0]
+        self.king_squares = [-1, -1]
+        # Squares attacked by the piece on each square, own pieces included
+        self.attacks_from = [0] * 64
+        # Per color union of attacks_from, rebuilt lazily after a change
+        self._attack_maps = [None, None]
+        # Number of moves on the undo stack
+        self.ply = 0
+        self._undo_records = array('Q', bytes(8 * HISTORY_CAPACITY))
+        self._undo_keys = array('Q', bytes(8 * HISTORY_CAPACITY))
+        # Zobrist key -> occurrences since the last irreversible move or setup,
+        # current position included
+        self.repetitions = {}
+        # (zobrist key, legal moves) of the last position asked about
+        self._legal_cache = None
+
+    @classmethod
+    def initial(cls):
+        return cls.from_fen(START_FEN)
+
+    @classmethod
+    def from_fen(cls, fen):
+        position = cls()
+        position.set_fen(fen)
+        return position
+
+    def set_fen(self, fen):
+        """Load a FEN string into this position in place.
+
+        The board is written in one pass and the derived state rebuilt once,
+        which is much cheaper than placing the pieces one by one. An en
+        passant square no pawn can capture on is dropped. Positions no game
+        can reach (a side without exactly one king, a pawn on a back rank,
+        the side not to move in check) raise ValueError, and a FEN that
+        fails leaves the position unchanged.
+        """
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError(f"Invalid FEN: {fen}")
+        rows = fields[0].split('/')
+        if len(rows) != BOARD_SIZE:
+            raise ValueError(f"Invalid FEN board: {fields[0]}")
+
+        board = array('b', bytes(BOARD_SIZE * BOARD_SIZE))
+        bitboards = [0] * 13
+        for row, text in enumerate(rows):
+            col = 0
+            for char in text:
+                if char in '12345678':
+                    col += int(char)
+                elif char in PIECE_LETTERS[1:] and col < BOARD_SIZE:
+                    sq = square_index(row, col)
+                    board[sq] = code = PIECE_LETTERS.index(char)
+                    bitboards[code] |= 1 << sq
+                    col += 1
+                else:
+                    raise ValueError(f"Invalid FEN board: {fields[0]}")
+            if col != BOARD_SIZE:
+                raise ValueError(f"Invalid FEN board: {fields[0]}")
+
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN side to move: {fields[1]}")
+        turn = WHITE if fields[1] == 'w' else BLACK
+        if popcount(bitboards[KING]) != 1 or popcount(bitboards[KING + 6]) != 1:
+            raise ValueError(f"Invalid FEN board, each side needs one king: {fields[0]}")
+        if (bitboards[PAWN] | bitboards[PAWN + 6]) & BACK_RANKS:
+            raise ValueError(f"Invalid FEN board, pawn on a back rank: {fields[0]}")
+        # A piece attacks the king when the same piece standing on the king's
+        # square would attack it
+        king = bitboards[KING + 6 * (turn ^ 1)].bit_length() - 1
+        occupied = sum(bitboards)
+        offset = 6 * turn
+        for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            if piece_attacks(kind, turn ^ 1, king, occupied) & bitboards[kind + offset]:
+                raise ValueError(f"Invalid FEN, the side not to move is in check: {fen}")
+        castling = 0
+        if len(fields) > 2 and fields[2] != '-':
+            if not set(fields[2]) <= set(CASTLING_LETTERS):
+                raise ValueError(f"Invalid FEN castling rights: {fields[2]}")
+            for char in fields[2]:
+                castling |= 1 << CASTLING_LETTERS.index(char)
+        ep_square = -1
+        if len(fields) > 3 and fields[3] != '-':
+            ep = fields[3]
+            ep_rank = '6' if fields[1] == 'w' else '3'
+            if len(ep) != 2 or ep[0] not in 'abcdefgh' or ep[1] != ep_rank:
+                raise ValueError(f"Invalid FEN en passant square: {ep}")
+            ep_square = square_index(8 - int(ep[1]), 'abcdefgh'.index(ep[0]))
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"Invalid FEN move counters: {fen}")
+
+        self.board = board
+        self.turn = turn
+        # Rights without the king and rook on their home squares cannot be used
+        for right, king_sq, rook_sq, king in ((WHITE_KINGSIDE, 60, 63, KING),
+                                              (WHITE_QUEENSIDE, 60, 56, KING),
+                                              (BLACK_KINGSIDE, 4, 7, KING + 6),
+                                              (BLACK_QUEENSIDE, 4, 0, KING + 6)):
+            if board[king_sq] != king or board[rook_sq] != king - 2:
+                castling &= ~right
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.ply = 0
+        self._rebuild()
+        self.repetitions = {self.zobrist_key: 1}
+
+    def to_fen(self):
+        rows = []
+        for row in range(BOARD_SIZE):
+            text = ''
+            empty = 0
+            for code in self.board[row * BOARD_SIZE:(row + 1) * BOARD_SIZE]:
+                if code:
+                    if empty:
+                        text += str(empty)
+                        empty = 0
+                    text += PIECE_LETTERS[code]
+                else:
+                    empty += 1
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        side = 'w' if self.turn == WHITE else 'b'
+        castling = ''.join(letter for i, letter in enumerate(CASTLING_LETTERS)
+                           if self.castling >> i & 1) or '-'
+        ep = '-'
+        if self.ep_square >= 0:
+            row, col = divmod(self.ep_square, BOARD_SIZE)
+            ep = 'abcdefgh'[col] + str(8 - row)
+        return (f"{'/'.join(rows)} {side} {castling} {ep} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def _rebuild(self):
+        # Recompute all derived state from the board array in one pass
+        self.bitboards = [0] * 13
+        self.occupied = [0, 0]
+        self.king_squares = [-1, -1]
+        for sq, code in enumerate(self.board):
+            if code:
+                self.bitboards[code] |= 1 << sq
+                self.occupied[code > 6] |= 1 << sq
+                if code in (KING, KING + 6):
+                    self.king_squares[code > 6] = sq
+        occupied = self.occupied[0] | self.occupied[1]
+        self.attacks_from = [piece_attacks((code - 1) % 6 + 1, code > 6, sq, occupied) if code else 0
+                             for sq, code in enumerate(self.board)]
+        self._attack_maps = [None, None]
+        if self.ep_square >= 0 and not (PAWN_ATTACKS[self.turn ^ 1][self.ep_square] &
+                                        self.bitboards[PAWN + 6 * self.turn]):
+            self.ep_square = -1
+        self.zobrist_key = compute_key(self)
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.board = array('b', self.board)
+        position.turn = self.turn
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.zobrist_key = self.zobrist_key
+        position.bitboards = self.bitboards[:]
+        position.occupied = self.occupied[:]
+        position.king_squares = self.king_squares[:]
+        position.attacks_from = self.attacks_from[:]
+        position._attack_maps = self._attack_maps[:]
+        position.ply = self.ply
+        position._undo_records = array('Q', self._undo_records)
+        position._undo_keys = array('Q', self._undo_keys)
+        position.repetitions = dict(self.repetitions)
+        position._legal_cache = self._legal_cache
+        return position
+
+    @property
+    def current_player(self):
+        return COLORS[self.turn]
+
+    def get_piece_at(self, row, col):
+        """Helper method to get piece at given position"""
+        if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE:
+            return PIECES[self.board[row * BOARD_SIZE + col]]
+        return None
+
+    def set_piece_at(self, row, col, piece):
+        self._set(row * BOARD_SIZE + col, piece.code if piece else EMPTY)
+
+    def pieces(self, color):
+        """Yield (piece, (row, col)) for every piece of the given color"""
+        color_index = COLORS.index(color)
+        for sq, code in enumerate(self.board):
+            if code and (code > 6) == color_index:
+                yield PIECES[code], divmod(sq, BOARD_SIZE)
+
+    def king_square(self, color):
+        """Square index of the king of a color, or -1 if it is not on the board"""
+        return self.king_squares[COLORS.index(color)]
+
+    def attack_map(self, color):
+        """Bitboard of every square attacked by a color"""
+        return self._attack_map(COLORS.index(color))
+
+    def _attack_map(self, color_index):
+        attacks = self._attack_maps[color_index]
+        if attacks is None:
+            attacks = 0
+            attacks_from = self.attacks_from
+            for sq in iter_bits(self.occupied[color_index]):
+                attacks |= attacks_from[sq]
+            self._attack_maps[color_index] = attacks
+        return attacks
+
+    def defend_map(self, color):
+        """Bitboard of the pieces of a color that are protected by another piece"""
+        return self.attack_map(color) & self.occupied[COLORS.index(color)]
+
+    def is_square_attacked(self, sq, color):
+        return self._attack_map(COLORS.index(color)) >> sq & 1 == 1
+
+    def in_check(self):
+        """Whether the side to move is in check"""
+        king = self.king_squares[self.turn]
+        return king >= 0 and self._attack_map(self.turn ^ 1) >> king & 1 == 1
+
+    def legal_moves(self):
+        """Tuple of the legal moves of the side to move, memoized by Zobrist key"""
+        cache = self._legal_cache
+        if cache is None or cache[0] != self.zobrist_key:
+            cache = self._legal_cache = (self.zobrist_key,
+                                         tuple(LegalMoveGenerator.generate(self, self.turn)))
+        return cache[1]
+
+    def _set(self, sq, code):
+        # Single write path for the board so derived state can be kept in sync
+        board = self.board
+        old = board[sq]
+        mask = 1 << sq
+        if old:
+            self.bitboards[old] ^= mask
+            self.occupied[old > 6] ^= mask
+            if old in (KING, KING + 6) and self.king_squares[old > 6] == sq:
+                self.king_squares[old > 6] = -1
+        if code:
+            self.bitboards[code] ^= mask
+            self.occupied[code > 6] ^= mask
+            if code in (KING, KING + 6):
+                self.king_squares[code > 6] = sq
+        board[sq] = code
+        self.zobrist_key ^= PIECE_KEYS[old][sq] ^ PIECE_KEYS[code][sq]
+
+        occupied = self.occupied[0] | self.occupied[1]
+        attacks_from = self.attacks_from
+        if code:
+            attacks_from[sq] = piece_attacks((code - 1) % 6 + 1, code > 6, sq, occupied)
+        else:
+            attacks_from[sq] = 0
+
+        # Sliders looking through this square only change when its occupancy does
+        if not old or not code:
+            bitboards = self.bitboards
+            sliders = (rook_attacks(sq, occupied) & (bitboards[ROOK] | bitboards[QUEEN] |
+                                                     bitboards[ROOK + 6] | bitboards[QUEEN + 6]) |
+                       bishop_attacks(sq, occupied) & (bitboards[BISHOP] | bitboards[QUEEN] |
+                                                       bitboards[BISHOP + 6] | bitboards[QUEEN + 6]))
+            for slider in iter_bits(sliders):
+                slider_code = board[slider]
+                attacks_from[slider] = piece_attacks((slider_code - 1) % 6 + 1, slider_code > 6,
+                                                     slider, occupied)
+        self._attack_maps[0] = self._attack_maps[1] = None
+
+    def make_move(self, move):
+        """Play a packed move and pass the turn, returning the captured piece code"""
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        promotion = move >> 12 & 7
+        board = self.board
+        piece = board[from_sq]
+        captured = board[to_sq]
+        turn = self.turn
+        ep_square = self.ep_square
+        kind = (piece - 1) % 6 + 1
+        captured_sq = to_sq
+        if kind == PAWN and to_sq == ep_square:
+            # En passant, the captured pawn is beside the target square
+            captured_sq = to_sq + 8 if turn == WHITE else to_sq - 8
+            captured = board[captured_sq]
+
+        ply = self.ply
+        if ply == len(self._undo_records):
+            # Double the stack; games this long are rare, searches never get here
+            self._undo_records.extend(self._undo_records)
+            self._undo_keys.extend(self._undo_keys)
+        self._undo_records[ply] = (move | captured << 16 | self.castling << 20 |
+                                   (ep_square + 1) << 24 | self.halfmove_clock << 32)
+        self._undo_keys[ply] = self.zobrist_key
+        self.ply = ply + 1
+
+        if captured_sq != to_sq:
+            self._set(captured_sq, EMPTY)
+        self._set(to_sq, promotion + 6 * turn if promotion else piece)
+        self._set(from_sq, EMPTY)
+        if kind == KING and abs(to_sq - from_sq) == 2:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            self._set(rook_to, board[rook_from])
+            self._set(rook_from, EMPTY)
+
+        key = self.zobrist_key ^ SIDE_KEY
+        castling = self.castling & CASTLING_MASKS[from_sq] & CASTLING_MASKS[to_sq]
+        if castling != self.castling:
+            key ^= CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[castling]
+            self.castling = castling
+        if ep_square >= 0:
+            key ^= EP_KEYS[ep_square & 7]
+        ep_square = -1
+        if kind == PAWN and abs(to_sq - from_sq) == 16:
+            # Only kept when an enemy pawn stands ready to capture
+            target = (from_sq + to_sq) >> 1
+            if PAWN_ATTACKS[turn][target] & self.bitboards[PAWN + 6 * (turn ^ 1)]:
+                ep_square = target
+                key ^= EP_KEYS[target & 7]
+        self.ep_square = ep_square
+        self.zobrist_key = key
+
+        # Pawn moves and captures are irreversible and restart the count
+        if kind == PAWN or captured:
+            self.halfmove_clock = 0
+            self.repetitions = {key: 1}
+        else:
+            self.halfmove_clock += 1
+            self.repetitions[key] = self.repetitions.get(key, 0) + 1
+        if turn == BLACK:
+            self.fullmove_number += 1
+        self.turn = turn ^ 1
+        return captured
+
+    def unmake_move(self):
+        """Take back the last move played, returning it"""
+        if not self.ply:
+            raise IndexError("No move to take back")
+        self.ply -= 1
+        record = self._undo_records[self.ply]
+        if self.halfmove_clock:
+            key = self.zobrist_key
+            count = self.repetitions[key] - 1
+            if count:
+                self.repetitions[key] = count
+            else:
+                del self.repetitions[key]
+        else:
+            # An irreversible move: count the keys of the stretch before it again
+            repetitions = {}
+            for key in self._undo_keys[max(0, self.ply - (record >> 32)):self.ply + 1]:
+                repetitions[key] = repetitions.get(key, 0) + 1
+            self.repetitions = repetitions
+        move = record & 0xFFFF
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        captured = record >> 16 & 15
+        ep_square = (record >> 24 & 127) - 1
+
+        self.turn = turn = self.turn ^ 1
+        if turn == BLACK:
+            self.fullmove_number -= 1
+        piece = self.board[to_sq]
+        if move >> 12 & 7:
+            piece = PAWN + 6 * turn
+        kind = (piece - 1) % 6 + 1
+        self._set(from_sq, piece)
+        if kind == PAWN and to_sq == ep_square:
+            self._set(to_sq, EMPTY)
+            self._set(to_sq + 8 if turn == WHITE else to_sq - 8, captured)
+        else:
+            self._set(to_sq, captured)
+            if kind == KING and abs(to_sq - from_sq) == 2:
+                rook_from, rook_to = CASTLING_ROOKS[to_sq]
+                self._set(rook_from, self.board[rook_to])
+                self._set(rook_to, EMPTY)
+        self.castling = record >> 20 & 15
+        self.ep_square = ep_square
+        self.halfmove_clock = record >> 32
+        self.zobrist_key = self._undo_keys[self.ply]
+        return move
+
+    def repetition_count(self):
+        """How often the current position has occurred since the last irreversible move"""
+        return self.repetitions.get(self.zobrist_key, 0)
+
+    def insufficient_material(self):
+        """Whether neither side has the material left to mate.
+
+        True for king against king, a single minor piece against a bare
+        king, and bishops only, all on squares of one color.
+        """
+        bitboards = self.bitboards
+        if (bitboards[PAWN] | bitboards[PAWN + 6] | bitboards[ROOK] | bitboards[ROOK + 6] |
+                bitboards[QUEEN] | bitboards[QUEEN + 6]):
+            return False
+        knights = bitboards[KNIGHT] | bitboards[KNIGHT + 6]
+        bishops = bitboards[BISHOP] | bitboards[BISHOP + 6]
+        if popcount(knights | bishops) <= 1:
+            return True
+        return not knights and (not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES)
+
+    def last_move(self):
+        return self._undo_records[self.ply - 1] & 0xFFFF if self.ply else None
+
+    def move_history(self):
+        """Packed moves played since the position was set up, oldest first"""
+        return [record & 0xFFFF for record in self._undo_records[:self.ply]]
+
+    def __repr__(self):
+        rows = []
+        for row in range(BOARD_SIZE):
+            rows.append(''.join(PIECE_LETTERS[code] for code in
+                                self.board[row * BOARD_SIZE:(row + 1) * BOARD_SIZE]))
+        return '\n'.join(rows)
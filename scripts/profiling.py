@@ -0,0 +1,196 @@
+"""Opt-in timing of the rule, move and paint hot paths.
+
+Profiler.enable() swaps the target methods for timing wrappers and
+disable() puts the originals back, so nothing is measured, and nothing
+costs anything, unless profiling was switched on. main.py switches it on
+when CHESS_PROFILE (statistics as JSON) or CHESS_TRACE (Chrome trace, for
+chrome://tracing or Perfetto) name an output file.
+"""
+import functools
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+
+def _search_nodes(result):
+    return result.nodes
+
+
+# (module, Class.method, result -> nodes visited or None)
+PROFILE_TARGETS = (
+    ('scripts.game_state', 'GameState.get_piece_moves', len),
+    ('scripts.game_state', 'GameState.is_check', None),
+    ('scripts.game_state', 'GameState.would_be_in_check', None),
+    ('scripts.game_state', 'GameState.get_defensive_moves', len),
+    ('scripts.game_state', 'GameState.legal_moves', len),
+    ('scripts.game_state', 'GameState.draw_reason', None),
+    ('scripts.board', 'ChessBoard.square_clicked', None),
+    ('scripts.board', 'ChessBoard.make_move', None),
+    ('scripts.board', 'ChessBoard.sync_pieces', None),
+    ('scripts.board', 'ChessBoard.update_game_status', None),
+    ('scripts.square', 'ChessSquare.paintEvent', None),
+    ('scripts.board_view', 'BoardWidget.paintEvent', None),
+    ('scripts.engine', 'Search.search', _search_nodes),
+)
+
+# Latency samples kept per target for percentiles, reservoir sampled beyond
+SAMPLE_LIMIT = 10000
+# Trace events kept, the oldest are dropped first
+DEFAULT_MAX_EVENTS = 200000
+
+
+class _Stats:
+    __slots__ = ('count', 'total', 'max', 'nodes', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.nodes = 0
+        self.samples = []
+
+
+def _percentile(ordered, fraction):
+    # Nearest-rank percentile of an ascending list
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class Profiler:
+    """Per-target call counts, latencies, nodes and a trace of every call"""
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        self.max_events = max_events
+        self.stats = {}
+        self.events = []
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        # (owner, attribute, original descriptor) of every patched method
+        self._patched = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    @property
+    def enabled(self):
+        return bool(self._patched)
+
+    def enable(self, targets=PROFILE_TARGETS):
+        """Wrap the targets; modules that cannot be imported (no Qt) are skipped"""
+        for module_name, path, nodes in targets:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue
+            class_name, attribute = path.split('.')
+            owner = getattr(module, class_name)
+            original = owner.__dict__[attribute]
+            if isinstance(original, staticmethod):
+                wrapped = staticmethod(self._wrap(path, original.__func__, nodes))
+            else:
+                wrapped = self._wrap(path, original, nodes)
+            setattr(owner, attribute, wrapped)
+            self._patched.append((owner, attribute, original))
+
+    def disable(self):
+        """Restore every wrapped method"""
+        while self._patched:
+            owner, attribute, original = self._patched.pop()
+            setattr(owner, attribute, original)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.events = []
+            self.start_time = time.perf_counter()
+
+    def _wrap(self, name, function, nodes):
+        record = self.record
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            result = None
+            try:
+                result = function(*args, **kwargs)
+                return result
+            finally:
+                end = perf_counter()
+                record(name, start, end, nodes(result) if nodes and result is not None else 0)
+        return wrapper
+
+    def record(self, name, start, end, nodes=0):
+        elapsed = end - start
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = _Stats()
+            stats.count += 1
+            stats.total += elapsed
+            stats.nodes += nodes
+            if elapsed > stats.max:
+                stats.max = elapsed
+            if len(stats.samples) < SAMPLE_LIMIT:
+                stats.samples.append(elapsed)
+            else:
+                slot = self._random.randrange(stats.count)
+                if slot < SAMPLE_LIMIT:
+                    stats.samples[slot] = elapsed
+            if len(self.events) >= self.max_events:
+                del self.events[:self.max_events // 10]
+            self.events.append((name, start, elapsed, threading.get_ident(), nodes))
+
+    def summary(self):
+        """{target: statistics} with times in milliseconds"""
+        with self._lock:
+            items = list(self.stats.items())
+        summary = {}
+        for name, stats in items:
+            ordered = sorted(stats.samples)
+            summary[name] = {
+                'count': stats.count,
+                'total_ms': stats.total * 1000,
+                'mean_ms': stats.total * 1000 / stats.count,
+                'p50_ms': _percentile(ordered, 0.5) * 1000,
+                'p99_ms': _percentile(ordered, 0.99) * 1000,
+                'max_ms': stats.max * 1000,
+                'nodes': stats.nodes,
+            }
+        return summary
+
+    def write_json(self, path):
+        with open(path, 'w') as out:
+            json.dump({'pid': os.getpid(), 'targets': self.summary()}, out, indent=2)
+
+    def write_chrome_trace(self, path):
+        """Write complete ("X") events in the Chrome trace event format"""
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                  'ts': (start - self.start_time) * 1e6, 'dur': elapsed * 1e6,
+                  'args': {'nodes': nodes}}
+                 for name, start, elapsed, tid, nodes in events]
+        with open(path, 'w') as out:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, out)
+
+    def report(self, out=sys.stderr):
+        """Print a table of the targets, slowest in total first"""
+        summary = self.summary()
+        out.write(f"{'target':36} {'calls':>8} {'total ms':>10} {'p50 ms':>8} "
+                  f"{'p99 ms':>8} {'max ms':>8} {'nodes':>10}\n")
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]['total_ms']):
+            out.write(f"{name:36} {stats['count']:8} {stats['total_ms']:10.2f} "
+                      f"{stats['p50_ms']:8.3f} {stats['p99_ms']:8.3f} {stats['max_ms']:8.3f} "
+                      f"{stats['nodes']:10}\n")
@@ -1,8 +1,29 @@
 from scripts.constants import BOARD_SIZE, DIRECTIONS
+from scripts.bitboard import BitboardRules
+
+BACKENDS = ('mailbox', 'bitboard')
 
 class MoveRules:
+    """Pseudo-legal piece moves: no castling, en passant or promotion, and
+    moves that leave the king in check are included.
+
+    The game's rules are LegalMoveGenerator's, reached through GameState.
+    This is the older square-walking path, kept to compare the mailbox and
+    bitboard backends.
+    """
+    # 'mailbox' walks the board square by square, 'bitboard' uses BitboardRules
+    backend = 'mailbox'
+
+    @staticmethod
+    def set_backend(name):
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown move generation backend: {name}")
+        MoveRules.backend = name
+
     @staticmethod
     def get_valid_moves(piece, current_pos, board):
+        if MoveRules.backend == 'bitboard':
+            return BitboardRules.get_valid_moves(piece, current_pos, board)
         piece_type = piece.piece_type
         if piece_type == 'pawn':
             return MoveRules._get_pawn_moves(piece, current_pos, board)
@@ -19,19 +40,31 @@ class MoveRules:
             return MoveRules._get_king_moves(piece, current_pos, board)
         return []
 
+    @staticmethod
+    def get_all_moves(board, color):
+        """Get (piece, start, end) for every pseudo-legal move of a color"""
+        if MoveRules.backend == 'bitboard':
+            return BitboardRules.get_all_moves(board, color)
+        moves = []
+        for piece, start in board.pieces(color):
+            for end in MoveRules.get_valid_moves(piece, start, board):
+                moves.append((piece, start, end))
+        return moves
+
     @staticmethod
     def _get_pawn_moves(piece, current_pos, board):
         row, col = current_pos
         moves = []
         direction = -1 if piece.color == 'white' else 1
+        start_row = 6 if piece.color == 'white' else 1
         
         # Forward move
         next_row = row + direction
         if 0 <= next_row < BOARD_SIZE:
             if not board.get_piece_at(next_row, col):
                 moves.append((next_row, col))
-                # Initial two-square move
-                if not piece.has_moved:
+                # Initial two-square move, only from the pawn's starting rank
+                if row == start_row:
                     two_ahead = row + (2 * direction)
                     if 0 <= two_ahead < BOARD_SIZE and not board.get_piece_at(two_ahead, col):
                         moves.append((two_ahead, col))
@@ -0,0 +1,274 @@
+"""Lazy SMP: one search run by several processes sharing a transposition table.
+
+The main process searches exactly like Search and its result is the one
+returned. Helper processes search the same position at the same time,
+without a depth limit and each starting on a different root move, and
+every result they store lands in the shared table, where the main search
+picks it up as cutoffs and move ordering. Processes rather than threads
+sidestep the GIL.
+
+The table lives in multiprocessing.shared_memory and is written without
+locks. Every slot is two 64-bit words, key ^ data and data, so a slot torn
+by two processes writing at once no longer decodes to its key and reads as
+a miss.
+"""
+import sys
+import time
+from multiprocessing import cpu_count, get_context
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from scripts.engine import (Search, SearchStopped, MAX_PLY, BENCH_POSITIONS, BENCH_DEPTH,
+                            position_from_moves)
+
+# Header words before the slots
+GENERATION = 0
+HEADER_WORDS = 1
+# Two 64-bit words per slot
+SLOT_BYTES = 16
+# Scores are stored offset to keep them unsigned in 24 bits
+SCORE_OFFSET = 1 << 23
+# Control words shared with the helpers; word i > 0 is helper i's node count
+STOP = 0
+# Seconds between checks that the helpers are still alive while waiting on them
+HELPER_POLL = 1.0
+
+
+class SharedTranspositionTable:
+    """TranspositionTable with its slots in shared memory.
+
+    Created without a name it allocates the memory and owns it; given the
+    name of an existing table it attaches to it. Data words pack the move
+    (16 bits), score (24), depth (8), bound flag (8) and generation (8).
+    The generation is kept in the table header and only moved on by the
+    owner (advance()), so every process ages entries alike.
+    """
+
+    def __init__(self, entries=1 << 17, name=None):
+        if entries & (entries - 1):
+            raise ValueError("Transposition table size must be a power of two")
+        self.mask = entries - 1
+        self.owner = name is None
+        size = 8 * HEADER_WORDS + SLOT_BYTES * entries
+        if self.owner:
+            self.shm = SharedMemory(create=True, size=size)
+        else:
+            self.shm = SharedMemory(name=name)
+            if self.shm.size < size:
+                self.shm.close()
+                raise ValueError(f"Shared table {name} is smaller than {entries} entries")
+        self._words = self.shm.buf.cast('Q')
+        self.generation = self._words[GENERATION]
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def entries(self):
+        return self.mask + 1
+
+    def close(self):
+        """Detach, and free the memory if this process created it"""
+        if self._words is None:
+            return
+        self._words.release()
+        self._words = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def advance(self):
+        """Start a new search generation for every process using the table"""
+        self._words[GENERATION] = (self._words[GENERATION] + 1) & 255
+        self.generation = self._words[GENERATION]
+
+    def new_search(self):
+        # Called by every Search, so it only picks up the owner's generation
+        self.generation = self._words[GENERATION]
+
+    def clear(self):
+        self.shm.buf[8 * HEADER_WORDS:] = bytes(self.shm.size - 8 * HEADER_WORDS)
+
+    def probe(self, key):
+        """Return (key, depth, flag, score, move, generation) or None"""
+        index = HEADER_WORDS + ((key & self.mask) << 1)
+        words = self._words
+        data = words[index + 1]
+        if words[index] ^ data != key:
+            return None
+        return (key, data >> 40 & 255, data >> 48 & 255, (data >> 16 & 0xFFFFFF) - SCORE_OFFSET,
+                data & 0xFFFF, data >> 56)
+
+    def store(self, key, depth, flag, score, move):
+        index = HEADER_WORDS + ((key & self.mask) << 1)
+        words = self._words
+        old = words[index + 1]
+        if (old and words[index] ^ old != key and old >> 56 == self.generation
+                and depth < old >> 40 & 255):
+            return
+        data = (move | (score + SCORE_OFFSET) << 16 | depth << 40 | flag << 48 |
+                self.generation << 56)
+        words[index] = key ^ data
+        words[index + 1] = data
+
+
+class _HelperSearch(Search):
+    """Search of a helper process, stopped through the shared control words"""
+
+    def __init__(self, tt, index, control):
+        super().__init__(tt)
+        self.index = index
+        self.control = control
+
+    def _root_moves(self, position):
+        moves = super()._root_moves(position)
+        # A different first move per helper spreads them over the tree
+        shift = self.index % len(moves) if moves else 0
+        return moves[shift:] + moves[:shift]
+
+    def _count_node(self):
+        if self.control[STOP]:
+            raise SearchStopped()
+        super()._count_node()
+
+    def _check_limits(self):
+        self.control[self.index] = self.nodes
+        super()._check_limits()
+
+
+def _helper_loop(name, entries, index, control, jobs, done):
+    tt = SharedTranspositionTable(entries, name)
+    search = _HelperSearch(tt, index, control)
+    try:
+        while True:
+            position = jobs.get()
+            if position is None:
+                break
+            search.search(position, depth=MAX_PLY)
+            control[index] = search.nodes
+            done.put(index)
+    finally:
+        tt.close()
+
+
+class ParallelSearch:
+    """Search front end running Lazy SMP over a number of worker processes.
+
+    workers counts the main process, so 1 is a plain search on the shared
+    table. Helpers are started once and reused for every search; close()
+    them, or use the object as a context manager. The tablebase, if any,
+    is only probed by the main search.
+    """
+
+    def __init__(self, workers=None, entries=1 << 17, tablebase=None):
+        self.workers = max(1, workers or cpu_count())
+        self.tt = SharedTranspositionTable(entries)
+        self.main = Search(self.tt, tablebase)
+        context = get_context()
+        self._control = context.RawArray('Q', self.workers)
+        self._done = context.Queue()
+        self._helpers = []
+        for index in range(1, self.workers):
+            jobs = context.Queue()
+            process = context.Process(target=_helper_loop, daemon=True,
+                                      args=(self.tt.name, self.tt.entries, index,
+                                            self._control, jobs, self._done))
+            process.start()
+            self._helpers.append((process, jobs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def tablebase(self):
+        return self.main.tablebase
+
+    @tablebase.setter
+    def tablebase(self, tablebase):
+        self.main.tablebase = tablebase
+
+    def close(self):
+        for process, jobs in self._helpers:
+            jobs.put(None)
+        for process, jobs in self._helpers:
+            process.join()
+        self._helpers = []
+        self.tt.close()
+
+    def stop(self):
+        """Ask a running search to return its last completed iteration"""
+        self.main.stop()
+
+    def helper_nodes(self):
+        return sum(self._control[1:])
+
+    def search(self, position, depth=None, movetime=None, nodes=None, on_info=None):
+        """Search like Search.search; nodes in the results count every process"""
+        self.tt.advance()
+        for index in range(self.workers):
+            self._control[index] = 0
+        snapshot = position.copy()
+        for process, jobs in self._helpers:
+            jobs.put(snapshot)
+
+        def report(result):
+            result.nodes += self.helper_nodes()
+            on_info(result)
+
+        try:
+            result = self.main.search(position, depth, movetime, nodes,
+                                      report if on_info else None)
+        finally:
+            self._control[STOP] = 1
+            self._wait_for_helpers()
+        result.nodes = self.main.nodes + self.helper_nodes()
+        return result
+
+    def _wait_for_helpers(self):
+        waiting = len(self._helpers)
+        while waiting:
+            try:
+                self._done.get(timeout=HELPER_POLL)
+                waiting -= 1
+            except Empty:
+                if not all(process.is_alive() for process, _ in self._helpers):
+                    raise RuntimeError("A search helper process died")
+
+
+def scaling(worker_counts, depth=BENCH_DEPTH, entries=1 << 17, out=sys.stdout):
+    """Time the benchmark positions to a fixed depth per worker count.
+
+    Returns {workers: (seconds, nodes, nodes/s)}; speedup is time to depth
+    relative to the first worker count.
+    """
+    report = {}
+    for workers in worker_counts:
+        with ParallelSearch(workers, entries) as search:
+            elapsed = 0.0
+            nodes = 0
+            for _, moves in BENCH_POSITIONS:
+                search.tt.clear()
+                start = time.perf_counter()
+                result = search.search(position_from_moves(moves), depth=depth)
+                elapsed += time.perf_counter() - start
+                nodes += result.nodes
+        report[workers] = (elapsed, nodes, int(nodes / elapsed) if elapsed > 0 else 0)
+        base_time = report[worker_counts[0]][0]
+        out.write(f"workers {workers:3}  time {elapsed:7.2f}s  nodes {nodes:9}  "
+                  f"nps {report[workers][2]:8}  speedup {base_time / elapsed:5.2f}x\n")
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Lazy SMP scaling benchmark')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, cpu_count()}))
+    parser.add_argument('--depth', type=int, default=BENCH_DEPTH)
+    args = parser.parse_args()
+    print(f"{cpu_count()} cores, depth {args.depth}")
+    scaling(args.workers, args.depth)
@@ -4,6 +4,39 @@ from PyQt5.QtCore import Qt
 from scripts.event_handler import ChessEventHandler
 
 
+def draw_square(painter, rect, square):
+    """Paint a square's background and highlights into rect"""
+    painter.save()
+    
+    # Draw base color
+    painter.fillRect(rect, square.current_color)
+    
+    # Draw checkmate/check highlight
+    if square.is_checkmate:
+        overlay = QColor(255, 0, 0, 120)  # Semi-transparent red
+        painter.fillRect(rect, overlay)
+    
+    # Draw selection/move highlights
+    x, y, width, height = rect.x(), rect.y(), rect.width(), rect.height()
+    if square.is_selected:
+        pen = QPen(QColor(76, 175, 80), 3)
+        painter.setPen(pen)
+        painter.drawRect(x + 1, y + 1, width - 2, height - 2)
+    elif square.is_highlighted:
+        pen = QPen(QColor(76, 175, 80), 2)
+        painter.setPen(pen)
+        painter.drawRect(x + 1, y + 1, width - 2, height - 2)
+        
+        # Draw green circle in center
+        painter.setBrush(QColor(76, 175, 80, 120))
+        painter.setPen(Qt.NoPen)
+        circle_size = min(width, height) // 3
+        painter.drawEllipse(x + (width - circle_size) // 2, y + (height - circle_size) // 2,
+                            circle_size, circle_size)
+    
+    painter.restore()
+
+
 class ChessSquare(QWidget):
     def __init__(self, row, col, color):
         super().__init__()
@@ -20,32 +53,7 @@ class ChessSquare(QWidget):
         
     def paintEvent(self, event):
         painter = QPainter(self)
-        
-        # Draw base color
-        painter.fillRect(self.rect(), self.current_color)
-        
-        # Draw checkmate/check highlight
-        if self.is_checkmate:
-            overlay = QColor(255, 0, 0, 120)  # Semi-transparent red
-            painter.fillRect(self.rect(), overlay)
-        
-        # Draw selection/move highlights
-        if self.is_selected:
-            pen = QPen(QColor(76, 175, 80), 3)
-            painter.setPen(pen)
-            painter.drawRect(1, 1, self.width()-2, self.height()-2)
-        elif self.is_highlighted:
-            pen = QPen(QColor(76, 175, 80), 2)
-            painter.setPen(pen)
-            painter.drawRect(1, 1, self.width()-2, self.height()-2)
-            
-            # Draw green circle in center
-            painter.setBrush(QColor(76, 175, 80, 120))
-            painter.setPen(Qt.NoPen)
-            circle_size = min(self.width(), self.height()) // 3
-            x = (self.width() - circle_size) // 2
-            y = (self.height() - circle_size) // 2
-            painter.drawEllipse(x, y, circle_size, circle_size)
+        draw_square(painter, self.rect(), self)
     
     def highlight_move(self):
         self.is_highlighted = True
@@ -60,5 +68,10 @@ class ChessSquare(QWidget):
         self.is_selected = False
         self.update()
 
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.piece:
+            self.piece.load_image()
+
     def mousePressEvent(self, event):
         ChessEventHandler.handle_square_click(self, event)
\ No newline at end of file
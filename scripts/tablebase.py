@@ -0,0 +1,355 @@
+"""Endgame tablebases for king and queen, rook or pawn against a bare king.
+
+Tables are built by retrograde analysis: starting from the mates, results
+are propagated backwards through un-moves one ply at a time, so every
+position gets its exact distance to mate.
+
+A table is one byte per position, for both sides to move, behind an 8 byte
+header:
+
+    index = side << 18 | strong king << 12 | weak king << 6 | piece
+
+where side 0 is the strong side to move. A byte of 1-127 is a win for the
+side to move with mate in that many plies, 128 + n a loss with mate in n
+plies (128 is checkmate on the board), 0 a draw and 255 an illegal
+position. Tables are stored with the strong side as white; positions where
+black has the piece are probed with the board mirrored. Probing is a
+single byte read from a memory map.
+"""
+import mmap
+import os
+from collections import defaultdict
+from itertools import starmap
+from scripts.bitboard import KING_ATTACKS, PAWN_ATTACKS, rook_attacks, bishop_attacks, iter_bits
+from scripts.constants import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, COLORS
+
+MAGIC = b'CPTB\x00\x00\x00\x01'
+HEADER_SIZE = len(MAGIC)
+TABLE_SIZE = 2 << 18
+WEAK_TO_MOVE = 1 << 18
+
+DRAW = 0
+LOSS = 128
+ILLEGAL = 255
+
+# Piece of the strong side in each table
+ENDGAMES = {'KQK': QUEEN, 'KRK': ROOK, 'KPK': PAWN}
+# Tables a pawn promotes into
+PROMOTION_TABLES = ('KQK', 'KRK')
+# Positions per task when a retrograde pass is split across processes
+UNMOVE_CHUNK = 4096
+
+
+def table_path(directory, name):
+    return os.path.join(directory, f"{name}.tb")
+
+
+def _piece_attacks(kind, sq, occupied):
+    if kind == QUEEN:
+        return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+    if kind == ROOK:
+        return rook_attacks(sq, occupied)
+    return PAWN_ATTACKS[WHITE][sq]
+
+
+def _strong_unmoves(kind, wk, bk, sq):
+    # Positions with the strong side to move that lead to (wk, bk, sq)
+    occupied = 1 << wk | 1 << bk | 1 << sq
+    for king in iter_bits(KING_ATTACKS[wk] & ~occupied & ~KING_ATTACKS[bk]):
+        yield king << 12 | bk << 6 | sq
+    base = wk << 12 | bk << 6
+    if kind == PAWN:
+        # White pawns move towards row 0, so they came from a higher row
+        if sq < 48 and not occupied >> (sq + 8) & 1:
+            yield base | sq + 8
+            if 32 <= sq < 40 and not occupied >> (sq + 16) & 1:
+                yield base | sq + 16
+    else:
+        for origin in iter_bits(_piece_attacks(kind, sq, occupied) & ~occupied):
+            yield base | origin
+
+
+def _weak_unmoves(wk, bk, sq):
+    # Positions with the weak side to move that lead to (wk, bk, sq)
+    for king in iter_bits(KING_ATTACKS[bk] & ~(1 << wk | 1 << sq) & ~KING_ATTACKS[wk]):
+        yield wk << 12 | king << 6 | sq
+
+
+def _init_rows(kind, wk_from, wk_to, promotion_tables):
+    # Static part of the table for white king squares wk_from to wk_to - 1:
+    # (strong bytes, weak bytes, moves_left, [(ply, index)] to seed the passes)
+    lo, hi = wk_from << 12, wk_to << 12
+    strong = bytearray([ILLEGAL]) * (hi - lo)
+    weak = bytearray([ILLEGAL]) * (hi - lo)
+    # Weak side moves not yet refuted; -1 when it can take the piece
+    moves_left = [0] * (hi - lo)
+    seeds = []
+
+    for wk in range(wk_from, wk_to):
+        for bk in range(64):
+            if wk == bk or KING_ATTACKS[wk] >> bk & 1:
+                continue
+            for sq in range(64):
+                if sq == wk or sq == bk or kind == PAWN and (sq < 8 or sq >= 56):
+                    continue
+                i = wk << 12 | bk << 6 | sq
+                # Squares the weak king may not step on, with it lifted off the board
+                attacked = KING_ATTACKS[wk] | _piece_attacks(kind, sq, 1 << wk)
+                in_check = attacked >> bk & 1
+                if not in_check:
+                    strong[i - lo] = DRAW
+                weak[i - lo] = DRAW
+
+                escapes = KING_ATTACKS[bk] & ~attacked
+                if escapes >> sq & 1:
+                    # The undefended piece can be taken, the weak side never loses
+                    moves_left[i - lo] = -1
+                elif escapes:
+                    moves_left[i - lo] = bin(escapes).count('1')
+                elif in_check:
+                    weak[i - lo] = LOSS
+                    seeds.append((0, WEAK_TO_MOVE | i))
+
+                if kind == PAWN and sq < 16 and not in_check and sq - 8 not in (wk, bk):
+                    target = WEAK_TO_MOVE | wk << 12 | bk << 6 | sq - 8
+                    for promoted in promotion_tables:
+                        value = promoted[target]
+                        if LOSS <= value < ILLEGAL:
+                            seeds.append((value - LOSS + 1, i))
+    return strong, weak, moves_left, seeds
+
+
+def _unmoves(kind, strong, indices):
+    # Every position one un-move before the given ones, by the strong side
+    # for weak side to move indices and the other way round
+    origins = []
+    if strong:
+        for i in indices:
+            origins.extend(_strong_unmoves(kind, i >> 12, i >> 6 & 63, i & 63))
+    else:
+        for i in indices:
+            origins.extend(_weak_unmoves(i >> 12, i >> 6 & 63, i & 63))
+    return origins
+
+
+def _parallel_unmoves(pool, kind, strong, indices):
+    if pool is None or len(indices) <= UNMOVE_CHUNK:
+        return _unmoves(kind, strong, indices)
+    chunks = [(kind, strong, indices[n:n + UNMOVE_CHUNK])
+              for n in range(0, len(indices), UNMOVE_CHUNK)]
+    return [origin for origins in pool.starmap(_unmoves, chunks) for origin in origins]
+
+
+def generate_table(kind, promotion_tables=(), pool=None):
+    """Build the table of an endgame and return it as a bytearray.
+
+    promotion_tables holds the KQK and KRK tables for KPK, whose pawn
+    promotes into them. Given a multiprocessing pool, the setup is split
+    by white king rows and every retrograde pass by chunks of positions,
+    which is where the time goes; the table is the same either way.
+    """
+    table = bytearray([ILLEGAL]) * TABLE_SIZE
+    moves_left = [0] * WEAK_TO_MOVE
+    # Ply -> positions resolved at that ply; strong entries are candidates
+    levels = defaultdict(list)
+
+    rows = [(kind, wk, wk + 8, promotion_tables) for wk in range(0, 64, 8)]
+    for (_, wk_from, wk_to, _), (strong, weak, left, seeds) in zip(
+            rows, pool.starmap(_init_rows, rows) if pool else starmap(_init_rows, rows)):
+        lo, hi = wk_from << 12, wk_to << 12
+        table[lo:hi] = strong
+        table[WEAK_TO_MOVE + lo:WEAK_TO_MOVE + hi] = weak
+        moves_left[lo:hi] = left
+        for ply, index in seeds:
+            levels[ply].append(index)
+
+    ply = 0
+    while levels:
+        frontier = levels.pop(ply, ())
+        # Weak side mated in ply: every strong move into it wins
+        mated = [index ^ WEAK_TO_MOVE for index in frontier if index & WEAK_TO_MOVE]
+        won = []
+        for index in frontier:
+            if not index & WEAK_TO_MOVE and table[index] == DRAW:
+                table[index] = ply
+                won.append(index)
+        following = []
+        for origin in _parallel_unmoves(pool, kind, True, mated):
+            if table[origin] == DRAW:
+                following.append(origin)
+        for origin in _parallel_unmoves(pool, kind, False, won):
+            left = moves_left[origin]
+            if left > 0:
+                moves_left[origin] = left - 1
+                if left == 1:
+                    # Every weak move loses, the slowest one in ply
+                    table[WEAK_TO_MOVE | origin] = LOSS + ply + 1
+                    following.append(WEAK_TO_MOVE | origin)
+        if following:
+            levels[ply + 1].extend(following)
+        ply += 1
+    return table
+
+
+def write_table(table, path):
+    with open(path, 'wb') as out:
+        out.write(MAGIC)
+        out.write(table)
+
+
+def _load_table(path):
+    with open(path, 'rb') as source:
+        data = source.read()
+    if data[:HEADER_SIZE] != MAGIC or len(data) != HEADER_SIZE + TABLE_SIZE:
+        raise ValueError(f"Not a tablebase file: {path}")
+    return data[HEADER_SIZE:]
+
+
+def _generate_file(directory, name, pool=None):
+    promotion_tables = ()
+    if ENDGAMES[name] == PAWN:
+        promotion_tables = [_load_table(table_path(directory, dependency))
+                            for dependency in PROMOTION_TABLES]
+    write_table(generate_table(ENDGAMES[name], promotion_tables, pool),
+                table_path(directory, name))
+    return name
+
+
+def generate_all(directory, workers=None, names=tuple(ENDGAMES)):
+    """Generate tables into a directory, yielding each name once written.
+
+    Tables are built one after another, each split across a pool of worker
+    processes; one worker builds them in this process.
+    """
+    from multiprocessing import Pool, cpu_count
+
+    os.makedirs(directory, exist_ok=True)
+    names = list(names)
+    # Pawn tables read the tables they promote into, so those go first
+    if any(ENDGAMES[name] == PAWN for name in names):
+        names += [name for name in PROMOTION_TABLES if name not in names]
+    names.sort(key=lambda name: ENDGAMES[name] == PAWN)
+    workers = workers or cpu_count()
+    if workers == 1:
+        for name in names:
+            yield _generate_file(directory, name)
+        return
+    with Pool(workers) as pool:
+        for name in names:
+            yield _generate_file(directory, name, pool)
+
+
+class Tablebase:
+    """Memory-mapped tables of a directory, probed in constant time"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = []
+        self.tables = {}
+        for name, kind in ENDGAMES.items():
+            path = table_path(directory, name)
+            if not os.path.exists(path):
+                continue
+            source = open(path, 'rb')
+            table = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            if table[:HEADER_SIZE] != MAGIC or len(table) != HEADER_SIZE + TABLE_SIZE:
+                table.close()
+                source.close()
+                raise ValueError(f"Not a tablebase file: {path}")
+            self._files.append(source)
+            self.tables[kind] = table
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for source in self._files:
+            source.close()
+        self.tables = {}
+        self._files = []
+
+    def probe(self, position):
+        """Return (wdl, plies) for the side to move, or None if no table covers it.
+
+        wdl is 1 for a win, -1 for a loss and 0 for a draw, and plies is the
+        distance to mate (0 for draws).
+        """
+        occupied = position.occupied[0] | position.occupied[1]
+        # More than three pieces, checked without counting them
+        rest = occupied & (occupied - 1)
+        rest &= rest - 1
+        if rest & (rest - 1):
+            return None
+        if not rest:
+            return 0, 0
+        bitboards = position.bitboards
+        for strong in (WHITE, BLACK):
+            offset = 6 * strong
+            for kind in (QUEEN, ROOK, PAWN, KNIGHT, BISHOP):
+                piece = bitboards[kind + offset]
+                if piece:
+                    break
+            if piece:
+                break
+        if kind in (KNIGHT, BISHOP):
+            # A lone minor piece cannot mate
+            return 0, 0
+        table = self.tables.get(kind)
+        if table is None:
+            return None
+
+        sq = piece.bit_length() - 1
+        wk = position.king_squares[strong]
+        bk = position.king_squares[strong ^ 1]
+        if strong == BLACK:
+            # Mirror top to bottom so the strong side plays up the board as white
+            sq ^= 56
+            wk ^= 56
+            bk ^= 56
+        side = 0 if position.turn == strong else 1
+        value = table[HEADER_SIZE + (side << 18 | wk << 12 | bk << 6 | sq)]
+        if value == ILLEGAL:
+            return None
+        if value >= LOSS:
+            return -1, value - LOSS
+        if value:
+            return 1, value
+        return 0, 0
+
+
+def format_result(result, color):
+    """Describe a probe result for the side to move of the given color"""
+    wdl, plies = result
+    if not wdl:
+        return 'theoretical draw'
+    other = COLORS[COLORS.index(color) ^ 1]
+    winner = color if wdl > 0 else other
+    if not plies:
+        return f"{winner.capitalize()} has mated"
+    return f"{winner.capitalize()} mates in {(plies + 1) // 2}"
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from scripts.position import Position
+
+    parser = argparse.ArgumentParser(description='Generate or probe endgame tablebases')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help='build the tables into a directory')
+    generate.add_argument('directory')
+    generate.add_argument('--workers', type=int, help='worker processes (default: all cores)')
+    generate.add_argument('--tables', nargs='+', choices=list(ENDGAMES), default=list(ENDGAMES))
+    probe = commands.add_parser('probe', help='look up a position')
+    probe.add_argument('directory')
+    probe.add_argument('fen')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        start = time.perf_counter()
+        for name in generate_all(args.directory, args.workers, args.tables):
+            print(f"{name} written to {table_path(args.directory, name)}")
+        print(f"time {time.perf_counter() - start:.1f}s")
+    else:
+        position = Position.from_fen(args.fen)
+        result = Tablebase(args.directory).probe(position)
+        print('not covered' if result is None else format_result(result, position.current_player))
@@ -0,0 +1,30 @@
+import random
+
+# Fixed seed so keys are identical in every process and across runs, which
+# transposition tables and position caches shared between workers rely on
+_random = random.Random(0x5EED_C4E55)
+
+
+def _key():
+    return _random.getrandbits(64)
+
+
+# PIECE_KEYS[code][sq]; the empty code 0 hashes to nothing
+PIECE_KEYS = [[0] * 64] + [[_key() for _ in range(64)] for _ in range(12)]
+SIDE_KEY = _key()
+# One key per castling rights bitmask and per en passant file
+CASTLING_KEYS = [_key() for _ in range(16)]
+EP_KEYS = [_key() for _ in range(8)]
+
+
+def compute_key(position):
+    """Hash a position from scratch, for setup and for verifying the incremental key"""
+    key = 0
+    for sq, code in enumerate(position.board):
+        key ^= PIECE_KEYS[code][sq]
+    if position.turn:
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[position.castling]
+    if position.ep_square >= 0:
+        key ^= EP_KEYS[position.ep_square & 7]
+    return key
@@ -0,0 +1,344 @@
+"""Headless game server hosting many concurrent games in one asyncio process.
+
+A game is a Game holding a Position, moves are validated with GameState,
+and no Qt is imported, so thousands of games fit in one process. Clients
+speak a line protocol over TCP, one command per line:
+
+    new [fen <FEN>]    -> game <id> <FEN>
+    join <id>          -> game <id> <FEN>, then every move played in the game
+    move <id> <uci>    -> moved <id> <uci> <result>, sent to everyone in the game
+    moves <id>         -> moves <id> <uci> ...   (the legal moves)
+    fen <id>           -> fen <id> <FEN>
+    leave <id>         -> left <id>
+    stats              -> stats games <n> bytes_per_game <n> moves <n> p50_us <n> ...
+    quit
+
+result is the PGN result, * while the game goes on, and failures are
+answered with error <message>. Nothing is written to disk: a game lives
+until the last connection in it leaves or disconnects.
+"""
+import asyncio
+import itertools
+import random
+import sys
+import time
+from scripts.game_state import GameState
+from scripts.move import move_to_uci, parse_uci
+from scripts.position import Position
+from scripts.profiling import Profiler
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7460
+# Games measured for the bytes_per_game estimate of stats
+MEMORY_SAMPLE = 100
+# Latency events the profiler keeps; percentiles come from its own samples
+LATENCY_EVENTS = 1000
+
+
+def deep_size(obj, seen=None):
+    """Bytes held by an object and everything it references, each counted once"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    else:
+        for name in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+class Game:
+    __slots__ = ('id', 'position', 'result', 'connections')
+
+    def __init__(self, game_id, position):
+        self.id = game_id
+        self.position = position
+        self.result = GameState.result(position)
+        self.connections = set()
+
+    def memory(self):
+        # The connections belong to the server, only the set is the game's
+        return (sys.getsizeof(self) + sys.getsizeof(self.connections) +
+                deep_size(self.position) + sys.getsizeof(self.result))
+
+
+class Connection:
+    """One client, with the games it has joined"""
+
+    def __init__(self, writer=None):
+        self.writer = writer
+        self.games = set()
+        # Lines sent when there is no socket, for driving the server directly
+        self.sent = []
+
+    def send(self, line):
+        if self.writer is None:
+            self.sent.append(line)
+        else:
+            self.writer.write(line.encode() + b'\n')
+
+
+class GameServer:
+    """Game table and protocol handler; start() puts it on a socket"""
+
+    def __init__(self):
+        self.games = {}
+        self._ids = itertools.count(1)
+        # Per move validation latency, see stats()
+        self.profiler = Profiler(max_events=LATENCY_EVENTS)
+
+    def new_game(self, fen=None):
+        position = Position.from_fen(fen) if fen else Position.initial()
+        game = Game(next(self._ids), position)
+        self.games[game.id] = game
+        return game
+
+    def play(self, game, text):
+        """Validate and play a UCI move, returning the result after it"""
+        start = time.perf_counter()
+        try:
+            position = game.position
+            try:
+                move = parse_uci(text)
+            except (ValueError, IndexError):
+                move = None
+            if game.result != '*':
+                raise ValueError(f"game {game.id} is over")
+            if move not in GameState.legal_moves(position, position.current_player):
+                raise ValueError(f"illegal move {text}")
+            position.make_move(move)
+            game.result = GameState.result(position)
+            return game.result
+        finally:
+            self.profiler.record('move', start, time.perf_counter())
+
+    def join(self, connection, game):
+        game.connections.add(connection)
+        connection.games.add(game.id)
+
+    def leave(self, connection, game_id):
+        connection.games.discard(game_id)
+        game = self.games.get(game_id)
+        if game is not None:
+            game.connections.discard(connection)
+            if not game.connections:
+                del self.games[game_id]
+
+    def disconnect(self, connection):
+        for game_id in list(connection.games):
+            self.leave(connection, game_id)
+
+    def stats(self):
+        """Game count, estimated bytes per game and move latency in microseconds"""
+        move = self.profiler.summary().get('move', {})
+        sample = list(itertools.islice(self.games.values(), MEMORY_SAMPLE))
+        return {
+            'games': len(self.games),
+            'bytes_per_game': sum(game.memory() for game in sample) // len(sample) if sample else 0,
+            'moves': move.get('count', 0),
+            'p50_us': round(move.get('p50_ms', 0) * 1000),
+            'p99_us': round(move.get('p99_ms', 0) * 1000),
+            'max_us': round(move.get('max_ms', 0) * 1000),
+        }
+
+    def _game(self, connection, args):
+        try:
+            game = self.games.get(int(args[0]))
+        except (ValueError, IndexError):
+            game = None
+        if game is None:
+            connection.send('error unknown game')
+        return game
+
+    def command(self, connection, line):
+        """Process one command line, returning False on quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'new':
+            fen = ' '.join(args[1:]) if args[:1] == ['fen'] else None
+            try:
+                game = self.new_game(fen)
+            except ValueError as error:
+                connection.send(f"error {error}")
+                return True
+            self.join(connection, game)
+            connection.send(f"game {game.id} {game.position.to_fen()}")
+        elif command == 'join':
+            game = self._game(connection, args)
+            if game:
+                self.join(connection, game)
+                connection.send(f"game {game.id} {game.position.to_fen()}")
+        elif command == 'move':
+            game = self._game(connection, args)
+            if game and len(args) < 2:
+                connection.send('error missing move')
+            elif game:
+                text = args[1]
+                try:
+                    result = self.play(game, text)
+                except ValueError as error:
+                    connection.send(f"error {error}")
+                    return True
+                for member in game.connections:
+                    member.send(f"moved {game.id} {text} {result}")
+        elif command == 'moves':
+            game = self._game(connection, args)
+            if game:
+                position = game.position
+                moves = GameState.legal_moves(position, position.current_player)
+                connection.send(' '.join([f"moves {game.id}"] + [move_to_uci(move) for move in moves]))
+        elif command == 'fen':
+            game = self._game(connection, args)
+            if game:
+                connection.send(f"fen {game.id} {game.position.to_fen()}")
+        elif command == 'leave':
+            game = self._game(connection, args)
+            if game:
+                self.leave(connection, game.id)
+                connection.send(f"left {game.id}")
+        elif command == 'stats':
+            connection.send('stats ' + ' '.join(f"{name} {value}"
+                                                for name, value in self.stats().items()))
+        elif command == 'quit':
+            return False
+        else:
+            connection.send(f"error unknown command {command}")
+        return True
+
+    async def serve_client(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or not self.command(connection, line.decode(errors='replace').strip()):
+                    break
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # Dropped connections and over-long lines end the session
+            pass
+        finally:
+            self.disconnect(connection)
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Listen for clients, returning the asyncio server"""
+        return await asyncio.start_server(self.serve_client, host, port)
+
+
+class GameClient:
+    """Minimal client for the line protocol"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def send(self, line):
+        self.writer.write(line.encode() + b'\n')
+        await self.writer.drain()
+
+    async def read(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError('server closed the connection')
+        return line.decode().strip()
+
+    async def request(self, line):
+        """Send a command and return the next line, its reply when no one else is in our games"""
+        await self.send(line)
+        return await self.read()
+
+    async def close(self):
+        await self.send('quit')
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def _play_games(client, count, plies, rng, round_trips):
+    game_ids = []
+    for _ in range(count):
+        game_ids.append(int((await client.request('new')).split()[1]))
+    for _ in range(plies):
+        for game_id in list(game_ids):
+            moves = (await client.request(f"moves {game_id}")).split()[2:]
+            if not moves:
+                game_ids.remove(game_id)
+                continue
+            start = time.perf_counter()
+            reply = await client.request(f"move {game_id} {rng.choice(moves)}")
+            round_trips.append(time.perf_counter() - start)
+            if not reply.startswith('moved') or not reply.endswith('*'):
+                game_ids.remove(game_id)
+
+
+async def load_test(games=1000, connections=50, plies=40, seed=0, out=sys.stdout):
+    """Play random games through local clients and report what the server needed"""
+    server = GameServer()
+    listener = await server.start(DEFAULT_HOST, 0)
+    port = listener.sockets[0].getsockname()[1]
+    rng = random.Random(seed)
+    round_trips = []
+    clients = [await GameClient.connect(DEFAULT_HOST, port) for _ in range(connections)]
+    start = time.perf_counter()
+    shares = [games // connections + (i < games % connections) for i in range(connections)]
+    await asyncio.gather(*(_play_games(client, share, plies, random.Random(rng.random()),
+                                       round_trips)
+                           for client, share in zip(clients, shares)))
+    elapsed = time.perf_counter() - start
+
+    stats = server.stats()
+    round_trips.sort()
+    out.write(f"games           {stats['games']} on {connections} connections\n")
+    out.write(f"moves           {stats['moves']} in {elapsed:.2f}s "
+              f"({stats['moves'] / elapsed:.0f} moves/s)\n")
+    out.write(f"memory          {stats['bytes_per_game']} bytes per game\n")
+    out.write(f"validation      p50 {stats['p50_us']} us  p99 {stats['p99_us']} us  "
+              f"max {stats['max_us']} us\n")
+    if round_trips:
+        out.write(f"round trip      p50 {round_trips[len(round_trips) // 2] * 1e6:.0f} us  "
+                  f"p99 {round_trips[int(len(round_trips) * 0.99)] * 1e6:.0f} us\n")
+    for client in clients:
+        await client.close()
+    listener.close()
+    await listener.wait_closed()
+    return stats
+
+
+async def serve(host, port):
+    listener = await GameServer().start(host, port)
+    print(f"listening on {host}:{port}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Headless multi-game server')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--load-test', action='store_true',
+                        help='play random games through local clients and report sizing figures')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--plies', type=int, default=40)
+    args = parser.parse_args()
+    try:
+        if args.load_test:
+            asyncio.run(load_test(args.games, args.connections, args.plies))
+        else:
+            asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,278 @@
+"""UCI front end for the engine, for GUIs, tournament managers and match scripts.
+
+Reads commands from stdin and answers on stdout. Only the Qt-free modules
+are imported, so it runs without a display server and starts quickly
+enough to spawn one process per game.
+"""
+import sys
+import threading
+from multiprocessing import cpu_count
+from scripts.book import OpeningBook
+from scripts.engine import Search, TranspositionTable, MATE_SCORE, MATE_THRESHOLD, MAX_PLY
+from scripts.move import move_to_uci, parse_uci
+from scripts.position import Position
+from scripts.smp import ParallelSearch, SLOT_BYTES
+from scripts.tablebase import Tablebase
+
+ENGINE_NAME = 'chess-python'
+ENGINE_AUTHOR = 'chess-python contributors'
+
+# Transposition table size option in MB, and the rough cost of one entry of
+# TranspositionTable; the shared table of ParallelSearch takes SLOT_BYTES
+HASH_DEFAULT, HASH_MIN, HASH_MAX = 16, 1, 1024
+TT_ENTRY_BYTES = 128
+# Search processes; more than one runs Lazy SMP over a shared table
+THREADS_MAX = max(1, cpu_count())
+
+# Moves assumed left in the game when the GUI does not say
+DEFAULT_MOVES_TO_GO = 30
+# Time kept in reserve for process and pipe overhead, in seconds
+MOVE_OVERHEAD = 0.05
+
+
+def allocate_time(time_left, increment, moves_to_go=None):
+    """Seconds to spend on this move given the clock, all in seconds"""
+    moves_to_go = moves_to_go or DEFAULT_MOVES_TO_GO
+    budget = time_left / moves_to_go + increment * 0.8
+    return max(0.01, min(budget, time_left - MOVE_OVERHEAD))
+
+
+def format_score(score):
+    if score > MATE_THRESHOLD:
+        return f"mate {(MATE_SCORE - score + 1) // 2}"
+    if score < -MATE_THRESHOLD:
+        return f"mate -{(MATE_SCORE + score + 1) // 2}"
+    return f"cp {score}"
+
+
+def tt_entries(megabytes, entry_bytes=TT_ENTRY_BYTES):
+    # Largest power of two that fits the requested size
+    entries = max(1, megabytes * (1 << 20) // entry_bytes)
+    return 1 << (entries.bit_length() - 1)
+
+
+class UCIEngine:
+    """Command interpreter for one UCI session.
+
+    The search runs on its own thread so stop and isready are answered
+    while it thinks.
+    """
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.output_lock = threading.Lock()
+        self.position = Position.initial()
+        self.hash_megabytes = HASH_DEFAULT
+        self.threads = 1
+        self.search = Search(TranspositionTable(tt_entries(HASH_DEFAULT)))
+        self.book = None
+        self.own_book = True
+        self.thread = None
+        # Set by stop, so an infinite search only reports its move when told to
+        self.stopped = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def handle(self, line):
+        """Process one command line, returning False on quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {HASH_DEFAULT} "
+                      f"min {HASH_MIN} max {HASH_MAX}")
+            self.send(f"option name Threads type spin default 1 min 1 max {THREADS_MAX}")
+            self.send('option name OwnBook type check default true')
+            self.send('option name BookFile type string default <empty>')
+            self.send('option name TablebasePath type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            self.search.tt.clear()
+            self.position = Position.initial()
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.stop()
+            return False
+        return True
+
+    def set_option(self, args):
+        text = ' '.join(args)
+        if 'name' not in args or 'value' not in args:
+            return
+        name = text.split('name', 1)[1].split('value', 1)[0].strip()
+        value = text.split('value', 1)[1].strip()
+        if name.lower() == 'hash':
+            try:
+                megabytes = min(max(int(value), HASH_MIN), HASH_MAX)
+            except ValueError:
+                return
+            self.hash_megabytes = megabytes
+            self.new_search()
+        elif name.lower() == 'threads':
+            try:
+                self.threads = min(max(int(value), 1), THREADS_MAX)
+            except ValueError:
+                return
+            self.new_search()
+        elif name.lower() == 'ownbook':
+            self.own_book = value.lower() == 'true'
+        elif name.lower() == 'bookfile':
+            if self.book:
+                self.book.close()
+                self.book = None
+            if value and value != '<empty>':
+                try:
+                    self.book = OpeningBook(value)
+                except (OSError, ValueError) as error:
+                    self.send(f"info string {error}")
+        elif name.lower() == 'tablebasepath':
+            self.stop()
+            if self.search.tablebase:
+                self.search.tablebase.close()
+                self.search.tablebase = None
+            if value and value != '<empty>':
+                try:
+                    self.search.tablebase = Tablebase(value)
+                except (OSError, ValueError) as error:
+                    self.send(f"info string {error}")
+
+    def new_search(self):
+        """Replace the search after a Hash or Threads change, keeping the tablebase"""
+        self.stop()
+        tablebase = self.search.tablebase
+        if isinstance(self.search, ParallelSearch):
+            self.search.close()
+        if self.threads > 1:
+            self.search = ParallelSearch(self.threads,
+                                         tt_entries(self.hash_megabytes, SLOT_BYTES), tablebase)
+        else:
+            self.search = Search(TranspositionTable(tt_entries(self.hash_megabytes)), tablebase)
+
+    def set_position(self, args):
+        if not args:
+            return
+        if args[0] == 'startpos':
+            fen, rest = None, args[1:]
+        elif args[0] == 'fen':
+            end = args.index('moves') if 'moves' in args else len(args)
+            fen, rest = ' '.join(args[1:end]), args[end:]
+        else:
+            return
+        try:
+            position = Position.from_fen(fen) if fen else Position.initial()
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        if rest and rest[0] == 'moves':
+            for text in rest[1:]:
+                try:
+                    move = parse_uci(text)
+                except ValueError:
+                    move = None
+                if move not in position.legal_moves():
+                    self.send(f"info string illegal move {text}")
+                    break
+                position.make_move(move)
+        self.position = position
+
+    def go(self, args):
+        options = {}
+        infinite = False
+        i = 0
+        while i < len(args):
+            name = args[i]
+            if name == 'infinite':
+                infinite = True
+            elif name in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'depth',
+                          'nodes', 'movetime', 'mate') and i + 1 < len(args):
+                try:
+                    options[name] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 1
+            i += 1
+
+        depth = options.get('depth')
+        if 'mate' in options:
+            depth = options['mate'] * 2
+        nodes = options.get('nodes')
+        movetime = options['movetime'] / 1000 if 'movetime' in options else None
+        clock = 'wtime' if self.position.turn == 0 else 'btime'
+        if movetime is None and clock in options and not infinite:
+            increment = options.get('winc' if clock == 'wtime' else 'binc', 0)
+            movetime = allocate_time(options[clock] / 1000, increment / 1000,
+                                     options.get('movestogo'))
+        if infinite or (depth is None and nodes is None and movetime is None):
+            depth = MAX_PLY
+
+        if self.book and self.own_book and not infinite:
+            move = self.book.choose(self.position)
+            if move:
+                self.send('info string book move')
+                self.send(f"bestmove {move_to_uci(move)}")
+                return
+
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._search,
+                                       args=(self.position, depth, movetime, nodes, infinite),
+                                       daemon=True)
+        self.thread.start()
+
+    def _search(self, position, depth, movetime, nodes, infinite):
+        result = self.search.search(position, depth=depth, movetime=movetime, nodes=nodes,
+                                    on_info=self._info)
+        if infinite:
+            self.stopped.wait()
+        if result.best_move:
+            self.send(f"bestmove {move_to_uci(result.best_move)}")
+        else:
+            self.send('bestmove 0000')
+
+    def _info(self, result):
+        pv = ' '.join(move_to_uci(move) for move in result.pv)
+        self.send(f"info depth {result.depth} score {format_score(result.score)} "
+                  f"nodes {result.nodes} nps {result.nps} "
+                  f"time {int(result.elapsed * 1000)} pv {pv}")
+
+    def stop(self):
+        """End the running search, if any, once it has reported its move"""
+        self.stopped.set()
+        if self.thread is None:
+            return
+        self.search.stop()
+        self.thread.join(0.01)
+        while self.thread.is_alive():
+            # A search that had not started yet cleared the first request
+            self.search.stop()
+            self.thread.join(0.01)
+        self.thread = None
+
+    def run(self, stream=sys.stdin):
+        for line in stream:
+            if not self.handle(line.strip()):
+                break
+        self.stop()
+        if isinstance(self.search, ParallelSearch):
+            self.search.close()
+
+
+if __name__ == '__main__':
+    UCIEngine().run()